@@ -0,0 +1,63 @@
+"""
+=========================================
+Benchmark of the fast epoching path
+=========================================
+
+This script compares the MNE path (RawArray, find_events, Epochs) with the
+array path of braininvaders2013.dataset (vectorized event detection and
+strided epoching) on synthetic runs shaped like the dataset, checks that
+both give the same epochs and prints their running times.
+
+"""
+# License: BSD (3-clause)
+
+import time
+
+import mne
+import numpy as np
+
+from braininvaders2013.benchmark import make_run
+from braininvaders2013.dataset import (CHNAMES, CHTYPES, SFREQ,
+                                       epoch_run, find_events, _epoch_data)
+
+
+def best_of(func, n_repeats=5):
+	durations = []
+	for _ in range(n_repeats):
+		start = time.perf_counter()
+		result = func()
+		durations.append(time.perf_counter() - start)
+	return min(durations), result
+
+
+if __name__ == '__main__':
+
+	data = make_run()
+	info = mne.create_info(ch_names=CHNAMES, sfreq=SFREQ, ch_types=CHTYPES, verbose=False)
+	params = dict(fmin=1, fmax=24, tmin=0.0, tmax=1.0)
+
+	def mne_path():
+		raw = mne.io.RawArray(data=data.copy(), info=info, verbose=False)
+		return epoch_run(raw, **params)
+
+	def array_path():
+		return _epoch_data(data, find_events(data[-1]), **params)[:2]
+
+	def mne_events():
+		raw = mne.io.RawArray(data=data, info=info, verbose=False)
+		return mne.find_events(raw, shortest_event=1, verbose=False)
+
+	def array_events():
+		return find_events(data[-1])
+
+	time_mne, (X_mne, y_mne) = best_of(mne_path)
+	time_array, (X_array, y_array) = best_of(array_path)
+	time_mne_events, events_mne = best_of(mne_events)
+	time_array_events, events_array = best_of(array_events)
+
+	assert np.array_equal(events_mne[:, [0, 2]], events_array[:, [0, 2]])
+	assert np.array_equal(y_mne, y_array)
+	np.testing.assert_allclose(X_array, X_mne, rtol=1e-7, atol=1e-12)
+
+	print('events     mne: {:.4f} s, array: {:.4f} s ({:.1f}x)'.format(time_mne_events, time_array_events, time_mne_events / time_array_events))
+	print('filter+epoch mne: {:.4f} s, array: {:.4f} s ({:.1f}x)'.format(time_mne, time_array, time_mne / time_array))
@@ -0,0 +1,54 @@
+"""
+=========================================
+Benchmark of the start-up of the package
+=========================================
+
+This script times, in fresh interpreters, the metadata-only use of the
+dataset that every worker process pays: importing braininvaders2013 and
+reading the subject list of a BrainInvaders2013 instance. It compares it
+with the same use after importing the heavy dependencies that the package
+used to load at import time (MNE, SciPy, pandas and PyYAML), and lists the
+heavy modules that are still imported.
+
+"""
+# License: BSD (3-clause)
+
+import sys
+import subprocess
+
+import numpy as np
+
+HEAVY = ['mne', 'scipy', 'pandas', 'yaml', 'sklearn', 'pyriemann', 'matplotlib']
+
+METADATA = '''
+import sys, time
+start = time.perf_counter()
+{imports}
+from braininvaders2013.dataset import BrainInvaders2013
+subjects = BrainInvaders2013().subject_list
+print(time.perf_counter() - start)
+print(' '.join(name for name in {heavy!r} if name in sys.modules))
+'''
+
+EAGER = 'import mne, scipy.io, scipy.signal, pandas, yaml'
+
+
+def startup(imports, repeats):
+	durations = []
+	for _ in range(repeats):
+		output = subprocess.check_output([sys.executable, '-c', METADATA.format(imports=imports, heavy=HEAVY)])
+		duration, loaded = output.decode().split('\n')[:2]
+		durations.append(float(duration))
+	return np.median(durations), loaded.split()
+
+if __name__ == '__main__':
+
+	repeats = 5
+	time_lazy, loaded_lazy = startup('', repeats)
+	time_eager, loaded_eager = startup(EAGER, repeats)
+
+	print('metadata only, lazy imports: {:.3f} s, heavy modules loaded: {}'.format(
+		time_lazy, ', '.join(loaded_lazy) or 'none'))
+	print('with the heavy imports: {:.3f} s, heavy modules loaded: {}'.format(
+		time_eager, ', '.join(loaded_eager)))
+	print('start-up {:.1f}x faster'.format(time_eager / time_lazy))
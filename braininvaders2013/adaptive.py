@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+import numpy as np
+from sklearn.covariance import ledoit_wolf
+from pyriemann.utils.distance import distance_riemann
+from pyriemann.utils.geodesic import geodesic_riemann
+
+
+def _lwf(X):
+    """Ledoit-Wolf covariance of the rows of X, as pyriemann's 'lwf'"""
+    C, _ = ledoit_wolf(X.T)
+    return C
+
+
+class AdaptiveERPMDM(object):
+    """ERP covariances and minimum distance to mean updated epoch by epoch
+
+    This is the incremental counterpart of the ``ERPCovariances(estimator=
+    'lwf', classes=[1])`` + ``MDM()`` pipeline. As in the adaptive
+    calibration of the experiment, the Target prototype is the mean of the
+    first n_calibration Target epochs and is then frozen: the epochs seen
+    so far are turned into the Ledoit-Wolf covariances of the prototype
+    stacked on the epoch, and from then on every new epoch is turned into
+    its covariance with the same prototype, so the class means and the
+    scored epochs share one feature space. The mean of each class is moved
+    along the Riemannian geodesic towards every new covariance, the n-th
+    matrix of a class having a weight 1/n, or at least forgetting. Each
+    update therefore costs the same whatever the number of epochs seen.
+
+    Parameters
+    ----------
+    n_calibration : int
+        Number of Target epochs averaged into the prototype. No epoch is
+        scored before they are seen.
+    forgetting : None | float
+        Lowest weight of a new covariance in the mean of its class, so
+        that the means follow slow changes of the signal. If None, the
+        means weigh every covariance equally.
+    """
+
+    def __init__(self, n_calibration=10, forgetting=None):
+        self.n_calibration = n_calibration
+        self.forgetting = forgetting
+        self.prototype_ = None
+        self.n_targets_ = 0
+        self.covmeans_ = {}
+        self.counts_ = {}
+        self._calibration = []
+
+    @property
+    def is_ready(self):
+        """whether both classes have a mean, so that epochs can be scored"""
+        return len(self.covmeans_) == 2
+
+    def covariance(self, x):
+        """ERP covariance of one epoch of shape (n_channels, n_times)"""
+        x = np.asarray(x, dtype=np.float64)
+        return _lwf(np.concatenate((self.prototype_, x), axis=0))
+
+    def _update_mean(self, C, y):
+        count = self.counts_.get(y, 0) + 1
+        if count == 1:
+            self.covmeans_[y] = C
+        else:
+            step = 1. / count
+            if self.forgetting is not None:
+                step = max(step, self.forgetting)
+            self.covmeans_[y] = geodesic_riemann(self.covmeans_[y], C, step)
+        self.counts_[y] = count
+
+    def update(self, x, y):
+        """learn from one epoch x of shape (n_channels, n_times) with label y"""
+
+        if self.prototype_ is not None:
+            self._update_mean(self.covariance(x), y)
+            return self
+
+        # calibration: the epochs are kept until the prototype is frozen
+        self._calibration.append((np.array(x, dtype=np.float64), y))
+        self.n_targets_ += int(y == 1)
+        if self.n_targets_ < self.n_calibration:
+            return self
+        self.prototype_ = np.mean([epoch for epoch, label in self._calibration if label == 1], axis=0)
+        for epoch, label in self._calibration:
+            self._update_mean(self.covariance(epoch), label)
+        self._calibration = []
+        return self
+
+    def partial_fit(self, X, y):
+        """learn from the epochs of X, one at a time and in order"""
+        for x, label in zip(X, y):
+            self.update(x, label)
+        return self
+
+    def predict_proba(self, X):
+        """softmax of the negative squared distances to the class means
+
+        Returns an array of shape (n_epochs, 2) with the probabilities of
+        the classes 0 and 1, as MDM.predict_proba.
+        """
+
+        distances = np.array([[distance_riemann(self.covariance(x), self.covmeans_[label])
+                               for label in (0, 1)] for x in X])
+        scores = -distances ** 2
+        scores = np.exp(scores - scores.max(axis=1, keepdims=True))
+        return scores / scores.sum(axis=1, keepdims=True)
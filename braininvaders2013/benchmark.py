@@ -0,0 +1,246 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+"""Benchmark of the loading, preprocessing and classification stages.
+
+The stages are run on synthetic data shaped like the dataset, so the
+benchmark works offline. Every stage is timed over several repeats and its
+peak of traced memory allocations is measured in a separate run, and the
+results are written as JSON::
+
+    python -m braininvaders2013.benchmark --output benchmark.json
+
+With ``--dtypes``, the report also compares the fast filtering and
+epoching path of ``BrainInvaders2013.get_epochs`` in float64 and float32.
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import tracemalloc
+
+import mne
+import numpy as np
+import scipy
+import sklearn
+from scipy.io import loadmat, savemat
+from sklearn.metrics import roc_auc_score
+from pyriemann.classification import MDM
+from pyriemann.estimation import ERPCovariances
+
+from . import filtering
+from .dataset import CHNAMES, SFREQ, EVENT_ID, _get_info, epoch_array
+from .cache import stim_onsets
+
+BENCHMARK_VERSION = 1
+
+
+def make_run(n_seconds=300, seed=42, flash_interval=0.25, p300=2e-6):
+    """return a synthetic run shaped like the runs of the dataset
+
+    The run has 16 EEG channels of white noise plus the stim channel, at
+    512 Hz, with a flash every ``flash_interval`` seconds; one flash out of
+    six is a Target and adds a positive deflection of amplitude ``p300``
+    between 250 and 500 ms on every EEG channel.
+
+    Returns
+    -------
+    data : ndarray, shape (17, n_samples)
+        The run, as the transposed 'data' array of the .mat files.
+    """
+
+    rng = np.random.RandomState(seed)
+    n_samples = int(n_seconds * SFREQ)
+    data = np.zeros((len(CHNAMES), n_samples))
+    data[:-1] = 1e-5 * rng.randn(len(CHNAMES) - 1, n_samples)
+
+    onsets = np.arange(SFREQ, n_samples - 2 * SFREQ, int(flash_interval * SFREQ))
+    targets = rng.rand(len(onsets)) < 1. / 6
+    response = np.hanning(SFREQ // 4) * p300
+    for onset, target in zip(onsets, targets):
+        if target:
+            data[-1, onset:onset + 10] = EVENT_ID['Target']
+            start = onset + SFREQ // 4
+            data[:-1, start:start + len(response)] += response
+        else:
+            data[-1, onset:onset + 10] = EVENT_ID['NonTarget']
+
+    return data
+
+
+def measure(func, setup=None, repeats=3):
+    """time func over several repeats and trace its peak memory once
+
+    setup, if given, is called before every run of func, outside of the
+    measurements, and its return value is passed to func.
+
+    Returns
+    -------
+    result : object
+        What the last call of func returned.
+    stats : dict
+        Minimum and mean durations in seconds and peak of the traced
+        allocations in bytes.
+    """
+
+    durations = []
+    for _ in range(repeats):
+        argument = () if setup is None else (setup(),)
+        start = time.perf_counter()
+        result = func(*argument)
+        durations.append(time.perf_counter() - start)
+
+    argument = () if setup is None else (setup(),)
+    tracemalloc.start()
+    try:
+        func(*argument)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    stats = {'repeats': repeats,
+             'time_min': min(durations),
+             'time_mean': sum(durations) / len(durations),
+             'peak_bytes': peak}
+    return result, stats
+
+
+def run_benchmark(n_seconds=300, repeats=3, seed=42, fmin=1, fmax=24,
+                  tmin=0.0, tmax=1.0):
+    """run every stage of the pipeline on a synthetic run
+
+    Returns
+    -------
+    report : dict
+        The parameters, the environment and, under 'stages', the stats of
+        every stage in pipeline order.
+    """
+
+    stages = []
+
+    def stage(name, func, setup=None):
+        result, stats = measure(func, setup, repeats)
+        record = {'name': name}
+        record.update(stats)
+        stages.append(record)
+        return result
+
+    data = make_run(n_seconds, seed)
+    with tempfile.TemporaryDirectory() as folder:
+        file_path = os.path.join(folder, 'run.mat')
+        savemat(file_path, {'data': data.T})
+        X = stage('load_mat', lambda: loadmat(file_path)['data'].T)
+
+    raw = stage('raw_array', lambda: mne.io.RawArray(data=X, info=_get_info(), verbose=False))
+    raw = stage('filter', lambda raw: raw.filter(fmin, fmax, verbose=False),
+                setup=lambda: raw.copy())
+    events = stage('find_events', lambda: mne.find_events(raw=raw, shortest_event=1, verbose=False))
+
+    def epoch():
+        epochs = mne.Epochs(raw, events, EVENT_ID, tmin=tmin, tmax=tmax,
+                            baseline=None, verbose=False, preload=True)
+        epochs.pick_types(eeg=True)
+        return epochs.get_data(), epochs.events[:, -1] == EVENT_ID['Target']
+
+    epochs, y = stage('epoch', epoch)
+    y = y.astype(int)
+
+    # train on the first half of the run, test on the second one
+    half = len(y) // 2
+    covariances = ERPCovariances(estimator='lwf', classes=[1])
+    covariances.fit(epochs[:half], y[:half])
+    C = stage('covariances', lambda: covariances.transform(epochs))
+    mdm = stage('mdm_fit', lambda: MDM().fit(C[:half], y[:half]))
+    proba = stage('mdm_predict', lambda: mdm.predict_proba(C[half:]))
+
+    return {'version': BENCHMARK_VERSION,
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'environment': {'python': platform.python_version(),
+                            'platform': platform.platform(),
+                            'numpy': np.__version__,
+                            'scipy': scipy.__version__,
+                            'mne': mne.__version__,
+                            'sklearn': sklearn.__version__},
+            'parameters': {'n_seconds': n_seconds, 'repeats': repeats,
+                           'seed': seed, 'fmin': fmin, 'fmax': fmax,
+                           'tmin': tmin, 'tmax': tmax,
+                           'n_epochs': len(y)},
+            'auc': roc_auc_score(y[half:], proba[:, 1]),
+            'stages': stages}
+
+
+def compare_dtypes(n_seconds=300, repeats=3, seed=42, fmin=1, fmax=24,
+                   tmin=0.0, tmax=1.0, dtypes=('float64', 'float32')):
+    """compare the fast epoching path in several dtypes
+
+    For every dtype, the synthetic run is converted once, as by the run
+    cache, then filtered and epoched as in ``BrainInvaders2013.get_epochs``.
+    The covariances are estimated from the epochs upcast to float64, as
+    in the units of ``evaluation.evaluate`` and ``evaluation.compare``,
+    since the shrinkage and the Riemannian means need the precision; the
+    AUC thus only reflects what the lower precision of the epochs loses.
+
+    Returns
+    -------
+    results : list of dict
+        For every dtype, its name, the bytes of the epochs, the stats of
+        the filter + epoch stage and the AUC.
+    """
+
+    data = make_run(n_seconds, seed)
+    samples, codes = stim_onsets(data[-1])
+
+    results = []
+    for dtype in dtypes:
+        run = data.astype(dtype)
+
+        def epoch():
+            eeg = filtering.filter_data(run[:-1], fmin, fmax, SFREQ)
+            X, kept = epoch_array(eeg, samples, tmin, tmax, SFREQ)
+            return X, codes[kept] == EVENT_ID['Target']
+
+        (epochs, y), stats = measure(epoch, repeats=repeats)
+        y = y.astype(int)
+
+        half = len(y) // 2
+        epochs64 = epochs.astype(np.float64)
+        covariances = ERPCovariances(estimator='lwf', classes=[1])
+        C = covariances.fit(epochs64[:half], y[:half]).transform(epochs64)
+        proba = MDM().fit(C[:half], y[:half]).predict_proba(C[half:])
+
+        record = {'dtype': np.dtype(dtype).name, 'epochs_bytes': epochs.nbytes,
+                  'auc': roc_auc_score(y[half:], proba[:, 1])}
+        record.update(stats)
+        results.append(record)
+
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--output', help='JSON file to write, default stdout')
+    parser.add_argument('--seconds', type=float, default=300,
+                        help='duration of the synthetic run')
+    parser.add_argument('--repeats', type=int, default=3,
+                        help='number of timed runs of every stage')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--dtypes', action='store_true',
+                        help='also compare the fast path in float64 and float32')
+    args = parser.parse_args(argv)
+
+    report = run_benchmark(args.seconds, args.repeats, args.seed)
+    if args.dtypes:
+        report['dtypes'] = compare_dtypes(args.seconds, args.repeats, args.seed)
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, 'w') as stream:
+            json.dump(report, stream, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,290 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+import os
+import io
+import json
+import shutil
+import uuid
+import hashlib
+import numpy as np
+
+from . import instrumentation
+
+CACHE_VERSION = 2
+EVENT_CODES = [33285, 33286]
+
+
+def _cache_paths(file_path, dtype=np.float64):
+    """return the paths of the cached array and of its sidecar
+
+    Runs are cached once per dtype; the float64 cache, which keeps the
+    precision of the .mat files, has no dtype suffix.
+    """
+    base = os.path.splitext(file_path)[0]
+    dtype = np.dtype(dtype)
+    if dtype != np.float64:
+        base = base + '.' + dtype.name
+    return base + '.npy', base + '.json'
+
+
+def source_signature(file_path, archive=None):
+    """describe the source file so that a stale cache can be detected
+
+    For a run read from inside a zip archive, the archive itself and the
+    name of the member are described instead of the .mat file.
+    """
+    if archive is not None:
+        path_zip, member = archive
+        stat = os.stat(path_zip)
+        return {'size': stat.st_size, 'mtime': stat.st_mtime,
+                'member': member}
+    stat = os.stat(file_path)
+    return {'size': stat.st_size, 'mtime': stat.st_mtime}
+
+
+def _read_mat(file_path, archive=None):
+    """parse a .mat run, from disk or from inside its zip archive"""
+    import zipfile
+    from scipy.io import loadmat
+    if archive is None:
+        with instrumentation.stage('loadmat', os.path.getsize(file_path)):
+            return loadmat(file_path)
+    path_zip, member = archive
+    with zipfile.ZipFile(path_zip, 'r') as zip_ref:
+        with instrumentation.stage('loadmat', zip_ref.getinfo(member).file_size):
+            return loadmat(io.BytesIO(zip_ref.read(member)))
+
+
+def count_samples(file_path, archive=None):
+    """return the number of samples of a run from the header of its .mat file
+
+    A run inside a zip archive is read through a stream of its member, so
+    the run is never held in memory as a whole, although seeking past its
+    samples still decompresses them.
+    """
+    import zipfile
+    from scipy.io import whosmat
+    if archive is None:
+        variables = whosmat(file_path)
+    else:
+        path_zip, member = archive
+        with zipfile.ZipFile(path_zip, 'r') as zip_ref, zip_ref.open(member) as stream:
+            variables = whosmat(stream)
+    shapes = dict((name, shape) for name, shape, _ in variables)
+    return int(shapes['data'][0])
+
+
+def stim_onsets(stim, event_codes=EVENT_CODES):
+    """return the samples and codes of the stimulation onsets
+
+    As with mne.find_events, an onset is a step of the stim channel to a
+    greater value, an event at the very first sample is ignored, and only
+    the onsets of the given event codes are kept.
+    """
+    stim = np.asarray(stim)
+    steps = np.flatnonzero(np.diff(stim)) + 1
+    steps = steps[stim[steps] > stim[steps - 1]]
+    codes = stim[steps]
+    is_event = np.any(codes[:, np.newaxis] == list(event_codes), axis=1)
+    return steps[is_event], codes[is_event].astype(int)
+
+
+def _stim_events(stim):
+    """return the [sample, code] pairs of the stimulation onsets"""
+    samples, codes = stim_onsets(stim)
+    return [[int(sample), int(code)] for sample, code in zip(samples, codes)]
+
+
+def read_sidecar(file_path, archive=None, dtype=np.float64):
+    """return the sidecar of a cached run, or None if it is missing or stale"""
+
+    _, sidecar_path = _cache_paths(file_path, dtype)
+    if not os.path.isfile(sidecar_path):
+        return None
+    with open(sidecar_path, 'r') as stream:
+        sidecar = json.load(stream)
+    if sidecar.get('version') != CACHE_VERSION:
+        return None
+    if sidecar.get('source') != source_signature(file_path, archive):
+        return None
+    return sidecar
+
+
+def _tmp_path(path):
+    """return a temporary path next to path, unique to the calling writer"""
+    return '{}.tmp-{}-{}'.format(path, os.getpid(), uuid.uuid4().hex[:8])
+
+
+def write_run(file_path, X, archive=None):
+    """write the decoded samples of a run next to its source file
+
+    The array is written before its sidecar and both are moved in place
+    atomically, so a sidecar only ever describes a complete array. Every
+    writer has its own temporary files, so processes caching the same run
+    at once each move a complete copy in place, the last one winning.
+    """
+
+    array_path, sidecar_path = _cache_paths(file_path, X.dtype)
+    if not os.path.isdir(os.path.dirname(array_path)):
+        os.makedirs(os.path.dirname(array_path), exist_ok=True)
+    X = np.ascontiguousarray(X)
+
+    tmp_array_path = _tmp_path(array_path)
+    with instrumentation.stage('cache_write', X.nbytes), open(tmp_array_path, 'wb') as stream:
+        np.lib.format.write_array(stream, X)
+    os.replace(tmp_array_path, array_path)
+
+    sidecar = {'version': CACHE_VERSION,
+               'source': source_signature(file_path, archive),
+               'shape': list(X.shape),
+               'dtype': X.dtype.str,
+               'events': _stim_events(X[-1])}
+    tmp_sidecar_path = _tmp_path(sidecar_path)
+    with open(tmp_sidecar_path, 'w') as stream:
+        json.dump(sidecar, stream)
+    os.replace(tmp_sidecar_path, sidecar_path)
+
+    return sidecar
+
+
+def load_run(file_path, archive=None, dtype=np.float64):
+    """return the samples of a run as a copy-on-write memory map
+
+    The .mat file is only parsed when there is no valid cache for it, i.e.
+    on first use or after its size or modification time has changed. The
+    returned array has shape (n_channels, n_samples) and is mapped with
+    mode 'c', so in-place operations such as filtering never touch the
+    cached file.
+
+    When archive is given as a (path_zip, member) pair, the run is read
+    from inside the zip archive and file_path is only the location where it
+    would be extracted, next to which the cache is written.
+
+    With a dtype other than float64, the samples are converted once when
+    the cache is written, so they are never held in float64 afterwards.
+    """
+
+    sidecar = read_sidecar(file_path, archive, dtype)
+    if sidecar is None:
+        X = _read_mat(file_path, archive)['data'].T.astype(dtype, copy=False)
+        sidecar = write_run(file_path, X, archive)
+        del X
+
+    array_path, _ = _cache_paths(file_path, dtype)
+    return np.load(array_path, mmap_mode='c'), sidecar
+
+
+def clear(file_path, dtypes=(np.float64, np.float32)):
+    """remove the cached files of a run, if any"""
+    for dtype in dtypes:
+        for path in _cache_paths(file_path, dtype):
+            if os.path.isfile(path):
+                os.remove(path)
+
+
+class EpochStore(object):
+    """on-disk cache of epoch arrays with a least-recently-used size limit
+
+    Every entry is a folder named after its key and holding ``X.npy``,
+    which is mapped in memory when read, and ``labels.npz`` with the other
+    per-epoch arrays. Reading an entry refreshes its modification time, and
+    the entries that were read least recently are removed whenever the
+    store grows beyond ``max_bytes``.
+
+    Parameters
+    ----------
+    directory : str
+        Folder of the store, created when needed.
+    max_bytes : int
+        Maximum total size of the entries, in bytes.
+    """
+
+    def __init__(self, directory, max_bytes=2 * 1024 ** 3):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def key(**params):
+        """hash keyword parameters, which must be JSON serializable"""
+        description = json.dumps(params, sort_keys=True)
+        return hashlib.sha1(description.encode('utf-8')).hexdigest()
+
+    def _entry(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key):
+        """return (X, arrays) for key, or None if it is not in the store"""
+
+        entry = self._entry(key)
+        if not os.path.isdir(entry):
+            return None
+        try:
+            X = np.load(os.path.join(entry, 'X.npy'), mmap_mode='r')
+            with np.load(os.path.join(entry, 'labels.npz')) as labels:
+                arrays = dict(labels)
+            os.utime(entry, None)
+        except (IOError, OSError, ValueError):
+            # evicted by another process while being read
+            return None
+        return X, arrays
+
+    def put(self, key, X, **arrays):
+        """add an entry, then evict old entries if the store is too large
+
+        The entry is written to a temporary folder that is renamed into
+        place, so concurrent writers of the same key never expose a
+        partially written entry.
+        """
+
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory, exist_ok=True)
+        tmp_entry = self._entry(key) + '.tmp-{}'.format(os.getpid())
+        if os.path.isdir(tmp_entry):
+            shutil.rmtree(tmp_entry)
+        os.makedirs(tmp_entry)
+        np.save(os.path.join(tmp_entry, 'X.npy'), X)
+        np.savez(os.path.join(tmp_entry, 'labels.npz'), **arrays)
+        try:
+            os.rename(tmp_entry, self._entry(key))
+        except OSError:
+            # another process stored the same entry first
+            shutil.rmtree(tmp_entry)
+        self.evict()
+
+    def _entries(self):
+        """return (mtime, size, path) of the complete entries"""
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+        for name in os.listdir(self.directory):
+            entry = os.path.join(self.directory, name)
+            if '.tmp-' in name or not os.path.isdir(entry):
+                continue
+            try:
+                size = sum(os.path.getsize(os.path.join(entry, filename))
+                           for filename in os.listdir(entry))
+                entries.append((os.path.getmtime(entry), size, entry))
+            except OSError:
+                continue
+        return entries
+
+    def size(self):
+        """return the total size of the entries, in bytes"""
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        """remove least recently used entries until the size limit is met"""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        """remove every entry"""
+        if os.path.isdir(self.directory):
+            shutil.rmtree(self.directory)
+
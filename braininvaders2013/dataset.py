@@ -1,19 +1,313 @@
 #!/usr/bin/env python
 # -*- coding: UTF-8 -*-
 
-import mne
 import numpy as np
 from . import download as dl
+from . import cache
+from . import filtering
+from . import index
+from . import instrumentation
+from . import storage
 import os
 import glob
-import zipfile
-from scipy.io import loadmat
-from distutils.dir_util import copy_tree
+import fnmatch
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
 import shutil
-import yaml
 
 BI2013a_URL = 'https://zenodo.org/record/2669187/files/'
 
+CHNAMES = ['Fp1',
+           'Fp2',
+           'F5',
+           'AFz',
+           'F6',
+           'T7',
+           'Cz',
+           'T8',
+           'P7',
+           'P3',
+           'Pz',
+           'P4',
+           'P8',
+           'O1',
+           'Oz',
+           'O2',
+           'STI 014']
+CHTYPES = ['eeg'] * 16 + ['stim']
+SFREQ = 512
+EVENT_ID = {'NonTarget': 33286, 'Target': 33285}
+
+
+_INFO = None
+
+
+def _get_info():
+    """return the measurement info shared by every run of the dataset"""
+
+    global _INFO
+    if _INFO is None:
+        import mne
+        _INFO = mne.create_info(ch_names=CHNAMES, sfreq=SFREQ,
+                                ch_types=CHTYPES, montage='standard_1020',
+                                verbose=False)
+    return _INFO.copy()
+
+
+def _load_run(file_path, archive=None):
+    """decode a .mat run into a memory-mapped MNE Raw object
+
+    The samples are read from the binary cache kept next to the .mat file,
+    which is (re)built from the .mat file when it is missing or stale. The
+    cache is mapped copy-on-write, so the pages of a decoded run can be
+    dropped by the OS instead of staying resident for as long as the Raw
+    object is alive. With archive given as a (path_zip, member) pair, the
+    run is read from inside the zip archive. MNE works in float64, so the
+    run is always decoded in float64 whatever the dtype of the dataset.
+    """
+
+    import mne
+
+    data, _ = cache.load_run(file_path, archive)
+    with instrumentation.stage('raw_array', data.nbytes):
+        raw = mne.io.RawArray(data=data, info=_get_info(), verbose=False)
+
+    return raw
+
+
+def find_events(stim, event_codes=(EVENT_ID['Target'], EVENT_ID['NonTarget'])):
+    """find the stimulation events of a run with vectorized operations
+
+    This is the array counterpart of ``mne.find_events(raw,
+    shortest_event=1)`` for the stim channel of the dataset, i.e. the last
+    row of a run.
+
+    Returns
+    -------
+    events : ndarray, shape (n_events, 3)
+        The onset samples, zeros and event codes, as in MNE.
+    """
+
+    samples, codes = cache.stim_onsets(stim, event_codes)
+    return np.c_[samples, np.zeros_like(samples), codes]
+
+
+def epoch_array(data, samples, tmin=0.0, tmax=1.0, sfreq=SFREQ):
+    """cut fixed-length windows out of continuous data
+
+    The epochs are gathered in one indexing operation on a strided view of
+    all the windows of the data, so the samples are copied once into the
+    output array. The window is sized as in mne.Epochs, and the windows
+    that do not fit in the data are dropped.
+
+    Parameters
+    ----------
+    data : ndarray, shape (n_channels, n_samples)
+        Continuous data.
+    samples : ndarray, shape (n_events,)
+        Onset samples of the events.
+    tmin, tmax : float
+        Window of the epochs around the onsets, in seconds.
+    sfreq : float
+        Sampling frequency of the data, in Hz.
+
+    Returns
+    -------
+    X : ndarray, shape (n_kept, n_channels, n_times)
+        The epochs.
+    kept : ndarray of bool, shape (n_events,)
+        Which events have an epoch in X.
+    """
+
+    offset = int(round(tmin * sfreq))
+    n_times = int(round(tmax * sfreq)) - offset + 1
+    n_channels, n_samples = data.shape
+    starts = np.asarray(samples, dtype=int) + offset
+    kept = (starts >= 0) & (starts + n_times <= n_samples)
+    if n_samples < n_times:
+        return np.empty((0, n_channels, n_times), dtype=data.dtype), kept
+
+    windows = np.lib.stride_tricks.as_strided(
+        data, shape=(n_samples - n_times + 1, n_channels, n_times),
+        strides=(data.strides[1], data.strides[0], data.strides[1]),
+        writeable=False)
+
+    return windows[starts[kept]], kept
+
+
+def _epoch_data(data, events, fmin, fmax, tmin, tmax):
+    """filter the EEG rows of a run and return its epochs, labels and onsets
+
+    This is the fast path of :func:`epoch_run`, working on the array of a
+    run rather than on MNE Raw and Epochs objects.
+    """
+
+    eeg = filtering.filter_data(data[:-1], fmin, fmax, SFREQ)
+    with instrumentation.stage('epoch') as stage:
+        X, kept = epoch_array(eeg, events[:, 0], tmin, tmax, SFREQ)
+        stage.add_bytes(X.nbytes)
+    events = events[kept]
+    y = (events[:, -1] == EVENT_ID['Target']).astype(int)
+
+    return X, y, events[:, 0]
+
+
+def _epoch_raw(raw, fmin, fmax, tmin, tmax):
+    """filter a run in place and return its epochs, labels and onsets"""
+
+    import mne
+
+    with instrumentation.stage('filter', raw._data.nbytes):
+        raw.filter(fmin, fmax, verbose=False)
+    with instrumentation.stage('epoch') as stage:
+        events = mne.find_events(raw=raw, shortest_event=1, verbose=False)
+        epochs = mne.Epochs(raw, events, EVENT_ID, tmin=tmin, tmax=tmax,
+                            baseline=None, verbose=False, preload=True)
+        epochs.pick_types(eeg=True)
+        stage.add_bytes(epochs._data.nbytes)
+
+    X = epochs.get_data()
+    y = (epochs.events[:, -1] == EVENT_ID['Target']).astype(int)
+    samples = epochs.events[:, 0]
+
+    return X, y, samples
+
+
+def epoch_run(raw, fmin=1, fmax=24, tmin=0.0, tmax=1.0):
+    """filter a run and cut it into labelled epochs
+
+    Returns the EEG epochs as an array of shape (n_epochs, n_channels,
+    n_times) and the labels (1 for Target, 0 for NonTarget).
+    """
+
+    X, y, _ = _epoch_raw(raw, fmin, fmax, tmin, tmax)
+    return X, y
+
+
+def _run_names(file_path):
+    """return the session and run names of a run from its path"""
+
+    session_number = file_path.split(os.sep)[-2].strip('Session')
+    session_name = 'session_' + session_number
+
+    run_number = file_path.split(os.sep)[-1]
+    run_number = run_number.split('_')[-1]
+    run_number = run_number.split('.mat')[0]
+    run_name = 'run_' + run_number
+
+    return session_name, run_name
+
+
+def _member_relpath(member, zipname):
+    """return where a zip member goes within the subject folder
+
+    Returns None for the members that are not needed, i.e. everything but
+    the .mat runs and meta.yml. The top-level folder named after the
+    archive is dropped, as its content is merged into the subject folder.
+    """
+
+    parts = member.split('/')
+    if parts[0] == os.path.splitext(zipname)[0]:
+        parts = parts[1:]
+    if len(parts) == 0 or parts[-1] == '':
+        return None
+    if not (parts[-1].endswith('.mat') or parts == ['meta.yml']):
+        return None
+    return os.path.join(*parts)
+
+
+def _archive_signature(path_zips):
+    """describe the archives of a subject so that a stale index can be detected"""
+
+    return [[os.path.basename(path_zip), os.path.getsize(path_zip), os.path.getmtime(path_zip)]
+            for path_zip in path_zips]
+
+
+def _archive_files(path_zip):
+    """return the size of every needed member of an archive, by extracted path"""
+
+    import zipfile
+
+    zipname = os.path.basename(path_zip)
+    with zipfile.ZipFile(path_zip, 'r') as zip_ref:
+        return {_member_relpath(member.filename, zipname): member.file_size
+                for member in zip_ref.infolist()
+                if _member_relpath(member.filename, zipname) is not None}
+
+
+def _extract_archive(path_zip, directory):
+    """stream the needed members of a zip archive into the subject folder
+
+    Every member is decompressed straight to its final location, through a
+    temporary file that is renamed once complete.
+    """
+
+    import zipfile
+
+    zipname = os.path.basename(path_zip)
+    with zipfile.ZipFile(path_zip, 'r') as zip_ref:
+        for member in zip_ref.infolist():
+            relpath = _member_relpath(member.filename, zipname)
+            if relpath is None:
+                continue
+            target = os.path.join(directory, relpath)
+            if not(os.path.isdir(os.path.dirname(target))):
+                os.makedirs(os.path.dirname(target))
+            with instrumentation.stage('unzip', member.file_size), \
+                    zip_ref.open(member) as source, open(target + '.part', 'wb') as destination:
+                shutil.copyfileobj(source, destination, 1 << 20)
+            os.replace(target + '.part', target)
+
+
+class LazyRuns(Mapping):
+    """mapping from run names to MNE Raw objects decoded on first access
+
+    Only the file paths are stored when the mapping is built. A run is
+    decoded the first time it is looked up and the same Raw object is
+    returned on later lookups, as with a regular dict. Testing whether a
+    run is in the mapping, iterating over its run names or taking its
+    length never decodes a run.
+    """
+
+    def __init__(self):
+        self._file_paths = {}
+        self._archives = {}
+        self._runs = {}
+
+    def add_run(self, run_name, file_path, archive=None):
+        self._file_paths[run_name] = file_path
+        self._archives[run_name] = archive
+
+    def file_path(self, run_name):
+        return self._file_paths[run_name]
+
+    def source(self, run_name):
+        """return the (file_path, archive) pair from which a run is read"""
+        return self._file_paths[run_name], self._archives[run_name]
+
+    def is_loaded(self, run_name):
+        return run_name in self._runs
+
+    def __getitem__(self, run_name):
+        if run_name not in self._runs:
+            self._runs[run_name] = _load_run(self._file_paths[run_name],
+                                             self._archives[run_name])
+        return self._runs[run_name]
+
+    def __contains__(self, run_name):
+        # the default of Mapping looks the run up, i.e. decodes it, so every
+        # `run in sessions[session]` of the callers would load the run
+        return run_name in self._file_paths
+
+    def __iter__(self):
+        return iter(self._file_paths)
+
+    def __len__(self):
+        return len(self._file_paths)
+
+    def __repr__(self):
+        return '<LazyRuns | {} runs, {} loaded>'.format(len(self), len(self._runs))
+
 class BrainInvaders2013():
     '''
     We describe the experimental procedures for a dataset that we have made publicly available at 
@@ -44,8 +338,20 @@ class BrainInvaders2013():
     BI.EEG.2013-GIPSA
     '''
 
-    def __init__(self, NonAdaptive=True, Adaptive=False, Training=True, Online=False):
+    def __init__(self, NonAdaptive=True, Adaptive=False, Training=True, Online=False, extract=True,
+                 epoch_cache_size=2 * 1024 ** 3, dtype='float64', keep_archives=True,
+                 disk_budget=None):
 
+        # dtype of the epochs returned by get_epochs, e.g. 'float32' to halve
+        # their memory footprint; the MNE objects of get_data stay in float64
+        self.dtype = np.dtype(dtype)
+        self.extract = extract
+        # with extract=True, keep_archives=False deletes the archives of a
+        # subject once its extraction is verified, and disk_budget (bytes)
+        # evicts the least recently used subjects, see enforce_storage
+        self.keep_archives = keep_archives
+        self.disk_budget = disk_budget
+        self.epoch_cache_size = epoch_cache_size
         self.adaptive = Adaptive
         self.nonadaptive = NonAdaptive
         self.training = Training
@@ -53,85 +359,258 @@ class BrainInvaders2013():
         self.subject_list = list(range(1, 24 + 1))
 
     def _get_single_subject_data(self, subject):
-        """return data for a single subject"""
+        """return data for a single subject
+
+        The runs of each session are wrapped in a lazy mapping, so the .mat
+        file of a run is only decoded when the run is first accessed.
+        """
 
-        file_path_list = self.data_path(subject)
         sessions = {}
-        for file_path in file_path_list:
-
-            session_number = file_path.split(os.sep)[-2].strip('Session')
-            session_name = 'session_' + session_number
-            if session_name not in sessions.keys():
-                sessions[session_name] = {}
-
-            run_number = file_path.split(os.sep)[-1]
-            run_number = run_number.split('_')[-1]
-            run_number = run_number.split('.mat')[0]
-            run_name = 'run_' + run_number
-
-            chnames = ['Fp1',
-                        'Fp2',
-                        'F5',
-                        'AFz',
-                        'F6',
-                        'T7',
-                        'Cz',
-                        'T8',
-                        'P7',
-                        'P3',
-                        'Pz',
-                        'P4',
-                        'P8',
-                        'O1',
-                        'Oz',
-                        'O2',
-                        'STI 014']
-            chtypes = ['eeg'] * 16 + ['stim']               
-
-            X = loadmat(file_path)['data'].T
-            info = mne.create_info(ch_names=chnames, sfreq=512,
-                                   ch_types=chtypes, montage='standard_1020',
-                                   verbose=False)
-            raw = mne.io.RawArray(data=X, info=info, verbose=False)    
-
-            sessions[session_name][run_name] = raw
+        for row in self._select_rows([subject]):
+            if row['session'] not in sessions.keys():
+                sessions[row['session']] = LazyRuns()
+            archive = None if row['archive'] is None else (row['archive'], row['member'])
+            sessions[row['session']].add_run(row['run'], row['path'], archive)
 
         return sessions
 
-    def data_path(self, subject, path=None, force_update=False,
-                  update_path=None, verbose=None):
+    def _epoch_store(self):
+        """return the on-disk store of epochs, kept in the data folder"""
+
+        directory = os.path.join(self._data_folder(), 'epochs')
+        return cache.EpochStore(directory, max_bytes=self.epoch_cache_size)
+
+    def _get_run_epochs(self, runs, run_name, params, store):
+        """return the epochs of one run, from the store when possible"""
 
-        if subject not in self.subject_list:
-            raise(ValueError("Invalid subject number"))
+        file_path, archive = runs.source(run_name)
+        if store is not None:
+            key = store.key(file_path=file_path,
+                            source=cache.source_signature(file_path, archive),
+                            dtype=self.dtype.name, **params)
+            entry = store.get(key)
+            if entry is not None:
+                X, arrays = entry
+                return X, arrays['y'], arrays['sample']
+
+        data, sidecar = cache.load_run(file_path, archive, self.dtype)
+        events = np.array(sidecar['events'], dtype=int).reshape(-1, 2)
+        events = np.c_[events[:, 0], np.zeros(len(events), dtype=int), events[:, 1]]
+        X, y, samples = _epoch_data(data, events, **params)
+        if store is not None:
+            store.put(key, X, y=y, sample=samples)
+
+        return X, y, samples
+
+    def get_epochs(self, subject, session=None, run='run_3', fmin=1, fmax=24,
+                   tmin=0.0, tmax=1.0, use_cache=True, n_jobs=1):
+        """return the filtered and labelled epochs of a subject
+
+        Filtering and epoching a run is done once for every set of
+        parameters: the epochs are kept in an on-disk store, where the
+        least recently used entries are evicted once the store holds more
+        than ``epoch_cache_size`` bytes.
+
+        Parameters
+        ----------
+        subject : int
+            Subject number.
+        session : None | str
+            Session name, e.g. 'session_1'. If None, every session is used.
+        run : None | str
+            Run name, e.g. 'run_3'. If None, every run is used; otherwise
+            the sessions without this run are skipped when session is None.
+            When no run matches, e.g. a subject without this run under the
+            experimental conditions of the dataset, the arrays are empty.
+        fmin, fmax : float
+            Band of the filter applied to the runs, in Hz.
+        tmin, tmax : float
+            Window of the epochs around the stimulations, in seconds.
+        use_cache : bool
+            Whether to read and write the on-disk store of epochs.
+        n_jobs : int
+            Number of threads among which the runs are filtered and
+            epoched. The filter of a band is designed once and the FFT
+            convolutions release the GIL, so the runs are processed
+            concurrently.
+
+        Returns
+        -------
+        X : ndarray, shape (n_epochs, n_channels, n_times)
+            The EEG epochs, with the dtype of the dataset.
+        y : ndarray, shape (n_epochs,)
+            The labels, 1 for Target and 0 for NonTarget.
+        metadata : pandas.DataFrame
+            The subject, session, run and onset sample of every epoch.
+        """
+
+        import pandas as pd
+
+        params = {'fmin': fmin, 'fmax': fmax, 'tmin': tmin, 'tmax': tmax}
+        store = self._epoch_store() if use_cache else None
+
+        sessions = self._get_single_subject_data(subject)
+        if session is not None and session not in sessions:
+            raise(ValueError('subject {} has no {} under the selected conditions'.format(subject, session)))
+        session_names = sorted(sessions) if session is None else [session]
+        selection = []
+        for session_name in session_names:
+            runs = sessions[session_name]
+            if run is None:
+                run_names = sorted(runs)
+            elif run in runs:
+                run_names = [run]
+            elif session is None:
+                continue
+            else:
+                raise(ValueError('{} of subject {} has no {} under the selected conditions'.format(
+                    session, subject, run)))
+            selection = selection + [(session_name, runs, run_name) for run_name in run_names]
+
+        def get_run_epochs(selected):
+            _, runs, run_name = selected
+            return self._get_run_epochs(runs, run_name, params, store)
+
+        if n_jobs == 1:
+            results = [get_run_epochs(selected) for selected in selection]
+        else:
+            with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+                results = list(executor.map(get_run_epochs, selection))
+
+        X_list, y_list, metadata_list = [], [], []
+        for (session_name, _, run_name), (X, y, samples) in zip(selection, results):
+            X_list.append(X)
+            y_list.append(y)
+            metadata_list.append(pd.DataFrame({'subject': subject,
+                                               'session': session_name,
+                                               'run': run_name,
+                                               'sample': samples},
+                                              columns=['subject', 'session', 'run', 'sample']))
+
+        if len(X_list) == 0:
+            n_times = int(round(tmax * SFREQ)) - int(round(tmin * SFREQ)) + 1
+            X_list.append(np.empty((0, len(CHNAMES) - 1, n_times), dtype=self.dtype))
+            y_list.append(np.empty(0, dtype=int))
+            metadata_list.append(pd.DataFrame({'subject': np.empty(0, dtype=int),
+                                               'session': np.empty(0, dtype=object),
+                                               'run': np.empty(0, dtype=object),
+                                               'sample': np.empty(0, dtype=int)},
+                                              columns=['subject', 'session', 'run', 'sample']))
+
+        if len(X_list) == 1:
+            X, y, metadata = X_list[0], y_list[0], metadata_list[0]
+        else:
+            X = np.concatenate(X_list)
+            y = np.concatenate(y_list)
+            metadata = pd.concat(metadata_list, ignore_index=True)
+
+        return X, y, metadata
+
+    def _zipnames(self, subject):
+        """return the names of the zip archives holding a subject's data"""
 
         if subject in [1, 2, 3, 4, 5, 6, 7]:
-            zipname_list = ['subject' + str(subject).zfill(2) + '_session' + str(i).zfill(2) + '.zip' for i in range(1, 8+1)]
+            return ['subject' + str(subject).zfill(2) + '_session' + str(i).zfill(2) + '.zip' for i in range(1, 8+1)]
         else:
-            zipname_list = ['subject' + str(subject).zfill(2) + '.zip'] 
+            return ['subject' + str(subject).zfill(2) + '.zip']
 
-        for i, zipname in enumerate(zipname_list):
+    def prefetch(self, subjects=None, n_jobs=4, manifest=None, path=None,
+                 base_url=BI2013a_URL, progress=True):
+        """download the archives of several subjects concurrently
 
-            url = BI2013a_URL + zipname
-            path_zip = dl.data_path(url, 'BRAININVADERS2013')
-            path_folder = path_zip.strip(zipname)
+        Parameters
+        ----------
+        subjects : None | list of int
+            Subjects to download. If None, ``subject_list`` is used.
+        n_jobs : int
+            Maximum number of concurrent downloads.
+        manifest : None | dict | 'zenodo'
+            Expected sizes and checksums of the archives, see
+            :func:`braininvaders2013.download.fetch_many`. With 'zenodo' the
+            manifest is fetched from the Zenodo record of the dataset.
+        path : None | str
+            Location of the data storing location.
+        base_url : str
+            Location the archives are downloaded from, e.g. a local mirror.
+            They are stored where the archives of the Zenodo record go, so
+            that the subjects are not downloaded again when selected.
+        progress : bool | callable
+            How the overall progress is reported.
+
+        Returns
+        -------
+        paths : list of str
+            Local paths of the archives.
+        """
+
+        if subjects is None:
+            subjects = self.subject_list
+        for subject in subjects:
+            if subject not in self.subject_list:
+                raise(ValueError("Invalid subject number"))
+        if manifest == 'zenodo':
+            manifest = dl.zenodo_manifest(BI2013a_URL.split('/')[-3])
+
+        zipnames = [zipname for subject in subjects for zipname in self._zipnames(subject)]
+        return dl.fetch_many([BI2013a_URL + zipname for zipname in zipnames],
+                             'BRAININVADERS2013', path=path,
+                             manifest=manifest, n_jobs=n_jobs,
+                             progress=progress,
+                             sources=[base_url + zipname for zipname in zipnames])
+
+    def data_path(self, subject, path=None, force_update=False,
+                  update_path=None, verbose=None):
+        """return the paths of the .mat runs of a subject
+
+        The paths are those of the extracted runs. With ``extract=False``
+        the archives are left untouched and the paths only tell where the
+        runs would be extracted.
+        """
+
+        return [file_path for file_path, _ in self._run_sources(subject)]
+
+    def _run_sources(self, subject):
+        """return the (file_path, archive) pairs of the runs of a subject
+
+        archive is None for an extracted run, or the (path_zip, member) pair
+        locating the run inside its zip archive when ``extract=False``.
+        """
+
+        return [(row['path'], None if row['archive'] is None else (row['archive'], row['member']))
+                for row in self._select_rows([subject])]
+
+    def select_runs(self, subjects=None):
+        """return the runs of some subjects matching the experimental conditions
+
+        The runs are read from an SQLite index kept in the data folder.
+        Subjects are downloaded and indexed the first time they are
+        selected, and indexed again if their archives change; afterwards
+        a selection is a single query.
+
+        Parameters
+        ----------
+        subjects : None | list of int
+            Subjects whose runs are selected. If None, ``subject_list`` is
+            used.
+
+        Returns
+        -------
+        runs : pandas.DataFrame
+            One row per run with its subject, session, run name,
+            experimental condition, type, path and number of samples.
+        """
+
+        import pandas as pd
+
+        if subjects is None:
+            subjects = self.subject_list
+        rows = self._select_rows(subjects)
+        runs = pd.DataFrame(rows, columns=index.COLUMNS)
+        return runs.drop(['archive', 'member'], axis=1)
+
+    def _conditions(self):
+        """return the experimental conditions and types selected by the flags"""
 
-            # check if has the directory for the subject
-            directory = path_folder + 'subject_' + str(subject).zfill(2) + os.sep
-            if not(os.path.isdir(directory)):
-                os.makedirs(directory)  
-
-            if not(os.path.isdir(directory + 'Session' + str(i+1))):
-                print('unzip', path_zip)
-                zip_ref = zipfile.ZipFile(path_zip, "r")
-                zip_ref.extractall(path_folder)
-                os.makedirs(directory + 'Session' + str(i+1))
-                copy_tree(path_zip.strip('.zip'), directory)
-                shutil.rmtree(path_zip.strip('.zip'))
-
-        # filter the data regarding the experimental conditions
-        meta_file = directory + os.sep + 'meta.yml'
-        with open(meta_file, 'r') as stream:
-            meta = yaml.load(stream)
         conditions = []
         if self.adaptive:
             conditions = conditions + ['adaptive']
@@ -142,17 +621,216 @@ class BrainInvaders2013():
             types = types + ['training']
         if self.online:
             types = types + ['online']
-        filenames = []
-        for run in meta['runs']:
-            run_condition = run['experimental_condition']
-            run_type = run['type']
-            if (run_condition in conditions) and (run_type in types):
-                filenames = filenames + [run['filename']]
-
-        # list the filepaths for this subject
-        subject_paths = []
-        for filename in filenames:
-            subject_paths = subject_paths + \
-                glob.glob(directory + os.sep + 'Session*'.format(subject) + os.sep + filename.replace('.gdf','.mat')) 
-
-        return subject_paths
+        return conditions, types
+
+    def _select_rows(self, subjects):
+        """index the subjects when needed, then select their runs"""
+
+        for subject in subjects:
+            if subject not in self.subject_list:
+                raise(ValueError("Invalid subject number"))
+
+        run_index = self._run_index()
+        conditions, types = self._conditions()
+        reused = []
+        for subject in subjects:
+            path_zips, signature = self._archives(subject)
+            if run_index.signature(subject, self.extract) != signature:
+                if path_zips is None:
+                    path_zips = self._path_zips(subject)
+                    signature = _archive_signature(path_zips)
+                run_index.replace(subject, self.extract, signature, self._index_subject(subject, path_zips))
+                continue
+            reused.append(subject)
+
+        with instrumentation.stage('index'):
+            rows = run_index.select(subjects, self.extract, conditions, types)
+
+        # extracted runs may have been deleted since they were indexed
+        if self.extract:
+            missing = set(row['subject'] for row in rows
+                          if row['subject'] in reused and not os.path.isfile(row['path']))
+            if len(missing) > 0:
+                for subject in missing:
+                    path_zips = self._path_zips(subject)
+                    run_index.replace(subject, self.extract, run_index.signature(subject, self.extract),
+                                      self._index_subject(subject, path_zips, force_extract=True))
+                rows = run_index.select(subjects, self.extract, conditions, types)
+
+        # a minute is precise enough to order the subjects for eviction, and
+        # spares the write of the index in the workers of an evaluation,
+        # whose subjects were just selected by the calling process
+        run_index.touch(subjects, resolution=60.)
+
+        return rows
+
+    def enforce_storage(self, keep=()):
+        """apply keep_archives and disk_budget to the data of the dataset
+
+        With ``keep_archives=False``, the archives of the subjects whose
+        extraction is verified are deleted; with a disk_budget, the least
+        recently selected subjects are evicted until their data fit in it,
+        see :class:`storage.DataManager`. This walks the folder of every
+        subject and may delete runs in use, so it is never done when runs
+        are selected, which also happens in the worker processes of the
+        evaluations. The evaluation and report functions call it from the
+        calling process, once their subjects are prepared and once they
+        are done; a script looping over get_epochs can call it between
+        subjects.
+
+        Parameters
+        ----------
+        keep : list of int
+            Subjects that must not be evicted, e.g. those about to be used.
+
+        Returns
+        -------
+        evicted : list of int
+            The evicted subjects, in eviction order.
+        """
+
+        manager = storage.DataManager(self)
+        if self.extract and not self.keep_archives:
+            manager.delete_archives()
+        if self.disk_budget is None:
+            return []
+        return manager.enforce_budget(self.disk_budget, keep=keep)
+
+    def _data_folder(self):
+        """return the folder where the archives of the dataset are stored"""
+
+        path, _, sign = dl._get_dataset_path('BRAININVADERS2013')
+        return os.path.join(path, 'MNE-{:s}-data'.format(sign.lower()))
+
+    def _run_index(self):
+        """return the SQLite index of the runs, kept in the data folder"""
+
+        folder = self._data_folder()
+        if not(os.path.isdir(folder)):
+            os.makedirs(folder)
+        return index.RunIndex(os.path.join(folder, 'index.sqlite'))
+
+    def _archive_paths(self, subject):
+        """return the local paths of the archives of a subject, present or not"""
+
+        path, _, sign = dl._get_dataset_path('BRAININVADERS2013')
+        return [dl._destination(BI2013a_URL + zipname, sign, path)
+                for zipname in self._zipnames(subject)]
+
+    def _subject_directory(self, subject):
+        """return the folder of the extracted runs and run caches of a subject"""
+
+        path_folder = os.path.dirname(self._archive_paths(subject)[0])
+        return os.path.join(path_folder, 'subject_' + str(subject).zfill(2))
+
+    def _path_zips(self, subject):
+        """return the local paths of the archives of a subject, downloading the missing ones"""
+
+        path_zips = []
+        for zipname, path_zip in zip(self._zipnames(subject), self._archive_paths(subject)):
+            if not(os.path.isfile(path_zip)):
+                path_zip = dl.data_path(BI2013a_URL + zipname, 'BRAININVADERS2013')
+            path_zips.append(path_zip)
+        return path_zips
+
+    def _archives(self, subject):
+        """return the archives of a subject and their signature
+
+        When the archives were deleted after a verified extraction, the
+        signature recorded at extraction is returned along with None, so
+        that the extracted runs are used without downloading anything.
+        Otherwise the missing archives are downloaded.
+        """
+
+        if self.extract and not all(os.path.isfile(path_zip) for path_zip in self._archive_paths(subject)):
+            marker = storage.verify_extraction(self._subject_directory(subject))
+            if marker is not None:
+                return None, marker['signature']
+        path_zips = self._path_zips(subject)
+        return path_zips, _archive_signature(path_zips)
+
+    def _index_subject(self, subject, path_zips, force_extract=False):
+        """list every run of a subject, whatever its condition and type
+
+        Archives are extracted first when ``extract=True`` (again, when
+        force_extract is True); otherwise the runs and meta.yml are read
+        straight from the archives.
+        """
+
+        import zipfile
+        import yaml
+
+        # runs of a previous extraction may have been deleted or truncated
+        if self.extract:
+            subject_directory = self._subject_directory(subject)
+            if storage.read_marker(subject_directory) is not None and \
+                    storage.verify_extraction(subject_directory) is None:
+                force_extract = True
+
+        members = {}
+        meta = None
+        for i, path_zip in enumerate(path_zips):
+
+            zipname = os.path.basename(path_zip)
+            path_folder = os.path.dirname(path_zip) + os.sep
+
+            # check if has the directory for the subject
+            directory = path_folder + 'subject_' + str(subject).zfill(2) + os.sep
+
+            if self.extract:
+                if not(os.path.isdir(directory)):
+                    os.makedirs(directory)
+                # the session folder may already hold cached runs, so
+                # look for the extracted .mat files themselves
+                if force_extract or len(glob.glob(directory + 'Session' + str(i+1) + os.sep + '*.mat')) == 0:
+                    print('unzip', path_zip)
+                    _extract_archive(path_zip, directory)
+                continue
+
+            # read the runs and the metadata straight from the archive
+            with zipfile.ZipFile(path_zip, 'r') as zip_ref:
+                for member in zip_ref.namelist():
+                    relpath = _member_relpath(member, zipname)
+                    if relpath is None:
+                        continue
+                    if relpath == 'meta.yml':
+                        with instrumentation.stage('yaml'):
+                            meta = yaml.safe_load(zip_ref.read(member))
+                    else:
+                        members[relpath] = (path_zip, member)
+
+        if self.extract:
+            # record what the archives hold, so that the extraction can be
+            # verified and the archives deleted, see storage.DataManager
+            files = {}
+            for path_zip in path_zips:
+                files.update(_archive_files(path_zip))
+            storage.write_marker(directory, _archive_signature(path_zips), files)
+
+            meta_file = directory + os.sep + 'meta.yml'
+            with instrumentation.stage('yaml', os.path.getsize(meta_file)), open(meta_file, 'r') as stream:
+                meta = yaml.safe_load(stream)
+
+        # list the runs of this subject in the order of meta.yml
+        rows = []
+        with instrumentation.stage('index'):
+            for run in meta['runs']:
+                pattern = os.path.join('Session*', run['filename'].replace('.gdf', '.mat'))
+                if self.extract:
+                    sources = [(file_path, None) for file_path in glob.glob(directory + pattern)]
+                else:
+                    sources = [(directory + relpath, members[relpath])
+                               for relpath in sorted(fnmatch.filter(members, pattern))]
+                for file_path, archive in sources:
+                    session_name, run_name = _run_names(file_path)
+                    rows.append({'subject': subject,
+                                 'session': session_name,
+                                 'run': run_name,
+                                 'condition': run['experimental_condition'],
+                                 'type': run['type'],
+                                 'path': file_path,
+                                 'archive': None if archive is None else archive[0],
+                                 'member': None if archive is None else archive[1],
+                                 'n_samples': cache.count_samples(file_path, archive)})
+
+        return rows
@@ -2,13 +2,15 @@
 # License: BSD Style.
 
 import os
+import json
+import hashlib
+import threading
 from os import path as op
+from concurrent.futures import ThreadPoolExecutor
 
-from mne.datasets.utils import _get_path, _do_path_update
-from mne.utils import _fetch_file, _url_to_local_path, verbose
+from . import instrumentation
 
 
-@verbose
 def data_path(url, sign, path=None, force_update=False, update_path=True,
               verbose=None):
     """Get path to local copy of given dataset URL.
@@ -44,20 +46,265 @@ def data_path(url, sign, path=None, force_update=False, update_path=True,
         of length one, for compatibility.
 
     """  # noqa: E501
-    sign = sign.upper()
-    key = 'MNE_DATASETS_{:s}_PATH'.format(sign)
-    key_dest = 'MNE-{:s}-data'.format(sign.lower())
-    path = _get_path(path, key, sign)
-    destination = _url_to_local_path(url, op.join(path, key_dest))
+    from mne.utils import verbose as _verbose
+    return _verbose(_data_path)(url, sign, path, force_update, update_path,
+                                verbose=verbose)
+
+
+def _data_path(url, sign, path=None, force_update=False, update_path=True,
+               verbose=None):
+    from mne.datasets.utils import _do_path_update
+    from mne.utils import _fetch_file
+
+    path, key, sign = _get_dataset_path(sign, path)
+    destination = _destination(url, sign, path)
     # Fetch the file
     if not op.isfile(destination) or force_update:
         if op.isfile(destination):
             os.remove(destination)
         if not op.isdir(op.dirname(destination)):
             os.makedirs(op.dirname(destination))
-        _fetch_file(url, destination, print_destination=False)
+        with instrumentation.stage('download') as stage:
+            _fetch_file(url, destination, print_destination=False)
+            stage.add_bytes(op.getsize(destination))
 
     # Offer to update the path
     _do_path_update(path, update_path, key, sign)
     
     return destination
+
+
+def _get_dataset_path(sign, path=None):
+    """return the root data folder, config key and signifier of a dataset"""
+    from mne.datasets.utils import _get_path
+    sign = sign.upper()
+    key = 'MNE_DATASETS_{:s}_PATH'.format(sign)
+    path = _get_path(path, key, sign)
+    return path, key, sign
+
+
+def _destination(url, sign, path):
+    """return the local path where the file at url is stored"""
+    from mne.utils import _url_to_local_path
+    key_dest = 'MNE-{:s}-data'.format(sign.lower())
+    return _url_to_local_path(url, op.join(path, key_dest))
+
+
+def zenodo_manifest(record, timeout=30.):
+    """Get the sizes and checksums of the files of a Zenodo record.
+
+    Parameters
+    ----------
+    record : str | int
+        Zenodo record identifier, e.g. 2669187.
+    timeout : float
+        Timeout of the request, in seconds.
+
+    Returns
+    -------
+    manifest : dict
+        Maps every file name of the record to a dict with its ``size`` in
+        bytes and its ``checksum`` as ``'<algorithm>:<hex digest>'``.
+    """
+    from urllib.request import urlopen
+
+    url = 'https://zenodo.org/api/records/{}'.format(record)
+    with urlopen(url, timeout=timeout) as response:
+        record = json.loads(response.read().decode('utf-8'))
+    return {entry['key']: {'size': entry['size'],
+                           'checksum': entry['checksum']}
+            for entry in record['files']}
+
+
+def _check_file(path, entry):
+    """raise an IOError if path does not match its manifest entry"""
+    size = op.getsize(path)
+    if 'size' in entry and size != entry['size']:
+        raise IOError('{} has {} bytes, expected {}'.format(
+            path, size, entry['size']))
+    if 'checksum' in entry:
+        algorithm, expected = entry['checksum'].split(':', 1)
+        digest = hashlib.new(algorithm)
+        with open(path, 'rb') as stream:
+            for chunk in iter(lambda: stream.read(1 << 20), b''):
+                digest.update(chunk)
+        if digest.hexdigest() != expected:
+            raise IOError('{} has {} checksum {}, expected {}'.format(
+                path, algorithm, digest.hexdigest(), expected))
+
+
+class _Progress(object):
+    """thread-safe byte and file counters shared by all the downloads"""
+
+    def __init__(self, n_files, total_bytes, callback):
+        self.n_files = n_files
+        self.total_bytes = total_bytes
+        self.done_files = 0
+        self.done_bytes = 0
+        self._callback = callback
+        self._lock = threading.Lock()
+
+    def update(self, n_bytes=0, n_files=0):
+        with self._lock:
+            self.done_bytes += n_bytes
+            self.done_files += n_files
+            if self._callback is not None:
+                self._callback(self.done_files, self.n_files,
+                               self.done_bytes, self.total_bytes)
+
+
+def _print_progress(done_files, n_files, done_bytes, total_bytes):
+    total = '?' if total_bytes is None else \
+        '{:.1f}'.format(total_bytes / 1e6)
+    print('\rdownloaded {}/{} files, {:.1f}/{} MB'.format(
+        done_files, n_files, done_bytes / 1e6, total), end='', flush=True)
+    if done_files == n_files:
+        print()
+
+
+def _remote_size(error):
+    """return the size given by the Content-Range of a 416 response, or None"""
+    content_range = error.headers.get('Content-Range', '')
+    try:
+        return int(content_range.split('/')[-1])
+    except ValueError:
+        return None
+
+
+def _fetch_resumable(url, destination, entry, progress, chunk_size=1 << 20,
+                     timeout=30.):
+    """download url to destination, resuming from a previous partial file"""
+    from urllib.error import HTTPError
+    from urllib.request import Request, urlopen
+
+    part = destination + '.part'
+    offset = op.getsize(part) if op.isfile(part) else 0
+    if 'size' in entry and offset > entry['size']:
+        offset = 0
+
+    request = Request(url)
+    if offset > 0:
+        request.add_header('Range', 'bytes={:d}-'.format(offset))
+    try:
+        response = urlopen(request, timeout=timeout)
+    except HTTPError as error:
+        if offset == 0 or error.code != 416:
+            raise
+        error.close()
+        if _remote_size(error) != offset:
+            # the partial file is longer than the remote file
+            os.remove(part)
+            return _fetch_resumable(url, destination, entry, progress,
+                                    chunk_size, timeout)
+        # the partial file already holds every byte of the remote file
+        progress.update(n_bytes=offset)
+    else:
+        with instrumentation.stage('download') as stage, response:
+            if offset > 0 and response.status != 206:
+                # the server ignored the range, start again from scratch
+                offset = 0
+            progress.update(n_bytes=offset)
+            with open(part, 'ab' if offset > 0 else 'wb') as stream:
+                for chunk in iter(lambda: response.read(chunk_size), b''):
+                    stream.write(chunk)
+                    progress.update(n_bytes=len(chunk))
+                    stage.add_bytes(len(chunk))
+
+    try:
+        _check_file(part, entry)
+    except IOError:
+        os.remove(part)
+        raise
+    os.replace(part, destination)
+    progress.update(n_files=1)
+
+    return destination
+
+
+def fetch_many(urls, sign, path=None, manifest=None, n_jobs=4,
+               force_update=False, update_path=True, progress=True,
+               sources=None):
+    """Download many files of a dataset concurrently.
+
+    Interrupted downloads are kept as ``.part`` files and resumed with an
+    HTTP range request on the next call, from servers that honour it. Every file, whether downloaded or
+    already present, is checked against the manifest when one is given.
+
+    Parameters
+    ----------
+    urls : list of str
+        Remote locations of the files, which also give their local paths as
+        in :func:`data_path`.
+    sign : str
+        Signifier of dataset, as in :func:`data_path`.
+    path : None | str
+        Location of the data storing location, as in :func:`data_path`.
+    manifest : None | dict
+        Maps file names (the last component of the urls) to dicts with an
+        optional ``size`` in bytes and an optional ``checksum`` given as
+        ``'<algorithm>:<hex digest>'``, see :func:`zenodo_manifest`.
+    n_jobs : int
+        Maximum number of concurrent downloads.
+    force_update : bool
+        Force update of the files even if local copies exist.
+    update_path : bool | None
+        If True, set the MNE_DATASETS_(signifier)_PATH in mne-python
+        config to the given path. If None, the user is prompted.
+    progress : bool | callable
+        If True, print the overall progress. A callable is called as
+        ``progress(done_files, n_files, done_bytes, total_bytes)`` whenever
+        some bytes are received; ``total_bytes`` is None when the manifest
+        does not give every size.
+    sources : None | list of str
+        Where the files are actually downloaded from, in the order of urls,
+        e.g. the same files on a local mirror. The local paths still follow
+        urls, so that :func:`data_path` finds the files afterwards. If None,
+        the files are downloaded from urls.
+
+    Returns
+    -------
+    paths : list of str
+        Local paths of the files, in the order of urls.
+    """
+    from mne.datasets.utils import _do_path_update
+
+    if manifest is None:
+        manifest = {}
+    if sources is None:
+        sources = urls
+    path, key, sign = _get_dataset_path(sign, path)
+
+    destinations = [_destination(url, sign, path) for url in urls]
+    entries = [manifest.get(url.split('/')[-1], {}) for url in urls]
+
+    pending = []
+    for source, destination, entry in zip(sources, destinations, entries):
+        if op.isfile(destination) and force_update:
+            os.remove(destination)
+        if op.isfile(destination):
+            _check_file(destination, entry)
+        else:
+            if not op.isdir(op.dirname(destination)):
+                os.makedirs(op.dirname(destination), exist_ok=True)
+            pending.append((source, destination, entry))
+
+    sizes = [entry.get('size') for _, _, entry in pending]
+    total_bytes = None if None in sizes else sum(sizes)
+    if progress is True:
+        progress = _print_progress
+    elif progress is False:
+        progress = None
+    counter = _Progress(len(pending), total_bytes, progress)
+
+    if pending:
+        with ThreadPoolExecutor(max_workers=max(n_jobs, 1)) as executor:
+            futures = [executor.submit(_fetch_resumable, source, destination,
+                                       entry, counter)
+                       for source, destination, entry in pending]
+            for future in futures:
+                future.result()
+
+    _do_path_update(path, update_path, key, sign)
+
+    return destinations
+
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+import numpy as np
+
+from . import filtering
+from .dataset import SFREQ
+
+
+class EpochSet(object):
+    """epochs of one wide window, cropped and decimated without re-epoching
+
+    The epochs are cut once over a window covering every window of
+    interest, at the full sampling rate. :meth:`crop` then returns a view
+    on a sub-window and :meth:`decimate` a view on every n-th sample, so
+    that sweeps over windows and sampling rates do not load, filter or
+    epoch the runs again. Only the events whose wide window fits in their
+    run are kept, which may drop a few epochs at the edges of the runs
+    that a narrower window would keep.
+
+    Parameters
+    ----------
+    X : ndarray, shape (n_epochs, n_channels, n_times)
+        The epochs.
+    y : ndarray, shape (n_epochs,)
+        Their labels.
+    metadata : None | pandas.DataFrame
+        Their subject, session, run and onset sample, as returned by
+        ``BrainInvaders2013.get_epochs``.
+    tmin : float
+        Time of the first sample of the epochs, in seconds.
+    sfreq : float
+        Sampling frequency of the epochs, in Hz.
+    lowpass : None | float
+        Upper edge of the band the epochs were filtered in, in Hz, i.e.
+        the fmax of get_epochs. None if they were not low-pass filtered.
+    """
+
+    def __init__(self, X, y, metadata=None, tmin=0.0, sfreq=SFREQ, lowpass=None):
+        self.X = X
+        self.y = y
+        self.metadata = metadata
+        self.tmin = tmin
+        self.sfreq = sfreq
+        self.lowpass = lowpass
+
+    @classmethod
+    def from_dataset(cls, dataset, subject, session=None, run='run_3', fmin=1, fmax=24,
+                     tmin=0.0, tmax=1.0, **kwargs):
+        """epoch a subject over the widest window of interest
+
+        The arguments are those of ``BrainInvaders2013.get_epochs``.
+        """
+
+        X, y, metadata = dataset.get_epochs(subject, session, run, fmin=fmin, fmax=fmax,
+                                            tmin=tmin, tmax=tmax, **kwargs)
+        return cls(X, y, metadata, tmin=int(round(tmin * SFREQ)) / SFREQ,
+                   sfreq=SFREQ, lowpass=fmax)
+
+    def __len__(self):
+        return len(self.y)
+
+    def __repr__(self):
+        return '<EpochSet | {} epochs, {:g} - {:g} s, {:g} Hz>'.format(
+            len(self), self.tmin, self.times[-1], self.sfreq)
+
+    @property
+    def times(self):
+        """times of the samples of the epochs, in seconds"""
+        return self.tmin + np.arange(self.X.shape[-1]) / self.sfreq
+
+    def _replace(self, X, tmin, sfreq, lowpass):
+        return EpochSet(X, self.y, self.metadata, tmin, sfreq, lowpass)
+
+    def crop(self, tmin=None, tmax=None):
+        """return the epochs over a sub-window, as a view
+
+        The sub-window is sized as the windows of get_epochs, so cropping
+        the epochs of a wide window gives the same samples as epoching the
+        runs over the narrow one.
+
+        Parameters
+        ----------
+        tmin, tmax : None | float
+            Bounds of the sub-window, in seconds. None keeps the current
+            bound.
+        """
+
+        start = 0 if tmin is None else self._index(tmin)
+        stop = self.X.shape[-1] if tmax is None else self._index(tmax) + 1
+        if start < 0 or stop > self.X.shape[-1] or start >= stop:
+            raise(ValueError('the window {} - {} s is not within the epochs, which '
+                             'span {:g} - {:g} s'.format(tmin, tmax, self.tmin, self.times[-1])))
+        return self._replace(self.X[..., start:stop], self.tmin + start / self.sfreq,
+                             self.sfreq, self.lowpass)
+
+    def _index(self, time):
+        """index of the sample closest to a time, rounded as in epoch_array"""
+        first = self.tmin * self.sfreq
+        if first == round(first):
+            # the samples are on the grid of the runs, as before decimation
+            return int(round(time * self.sfreq)) - int(round(first))
+        return int(round(time * self.sfreq - first))
+
+    def decimate(self, factor):
+        """return every factor-th sample of the epochs
+
+        As with MNE, decimating without aliasing needs the signal to be
+        band-limited to a third of the new sampling frequency. When the
+        low-pass edge of the epochs is below it, the result is a strided
+        view; otherwise the epochs are first low-pass filtered at a third
+        of the new sampling frequency, which yields a new array and has
+        edge effects at both ends of the epochs, so it is best done on a
+        window wider than the one finally used.
+
+        Parameters
+        ----------
+        factor : int
+            Decimation factor.
+        """
+
+        factor = int(factor)
+        if factor < 1:
+            raise(ValueError('the decimation factor must be a positive integer, got {}'.format(factor)))
+        sfreq = self.sfreq / factor
+        X, lowpass = self.X, self.lowpass
+        if factor > 1 and (lowpass is None or lowpass > sfreq / 3.):
+            lowpass = sfreq / 3.
+            X = filtering.filter_data(X, None, lowpass, self.sfreq)
+        return self._replace(X[..., ::factor], self.tmin, sfreq, lowpass)
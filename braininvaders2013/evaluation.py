@@ -0,0 +1,628 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+import os
+import time
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+import pandas as pd
+from sklearn.metrics import get_scorer, roc_auc_score
+from sklearn.model_selection import StratifiedKFold
+from sklearn.pipeline import make_pipeline
+from pyriemann.classification import MDM
+from pyriemann.estimation import ERPCovariances
+
+from .adaptive import AdaptiveERPMDM
+
+RESULT_COLUMNS = ['subject', 'session', 'run', 'fold', 'score']
+COMPARE_COLUMNS = ['pipeline'] + RESULT_COLUMNS
+TRANSFER_COLUMNS = ['scheme', 'subject', 'session', 'score', 'n_train', 'n_test']
+ADAPTIVE_COLUMNS = ['subject', 'session', 'run', 'score', 'refit_score',
+                    'n_epochs', 'n_scored', 'update_time']
+
+
+def _evaluate_unit(dataset, pipeline_factory, subject, session, run, fold,
+                   n_splits, scoring, epoch_params):
+    """score one fold of one run, as a self-contained unit of work"""
+
+    X, y, _ = dataset.get_epochs(subject, session, run, **epoch_params)
+    # the pipelines estimate covariances, which need float64 whatever the
+    # dtype of the epochs
+    X = X.astype(np.float64, copy=False)
+
+    skf = StratifiedKFold(n_splits=n_splits)
+    train, test = list(skf.split(X, y))[fold]
+    clf = pipeline_factory()
+    clf.fit(X[train], y[train])
+    score = get_scorer(scoring)(clf, X[test], y[test])
+
+    return [subject, session, run, fold, score]
+
+
+def _epoch_unit(dataset, subject, session, run, epoch_params):
+    """filter and epoch one run into the on-disk store of the dataset"""
+    dataset.get_epochs(subject, session, run, **epoch_params)
+
+
+def _store_params(dataset, epoch_params):
+    """parameters under which scores are stored: epoching and dtype of the epochs"""
+    return dict(epoch_params, dtype=dataset.dtype.name)
+
+
+def _n_workers(n_jobs):
+    if n_jobs is None or n_jobs == 0:
+        return 1
+    if n_jobs < 0:
+        return max(os.cpu_count() + 1 + n_jobs, 1)
+    return n_jobs
+
+
+def _run_units(func, units, n_jobs, callback=None):
+    """call func on every tuple of arguments of units, in a process pool
+
+    The results are returned in the order of units. callback, if given, is
+    called in the calling process with every result as soon as its unit
+    completes, so that it can be saved before the other units are done.
+    A unit that raises then does not stop the others: every other result
+    is still passed to callback, and the first error is raised once all
+    the units are done.
+    """
+
+    n_workers = _n_workers(n_jobs)
+    if callback is None:
+        if n_workers == 1:
+            return [func(*unit) for unit in units]
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            futures = [executor.submit(func, *unit) for unit in units]
+            return [future.result() for future in futures]
+
+    results, errors = [None] * len(units), []
+    if n_workers == 1:
+        for i, unit in enumerate(units):
+            try:
+                results[i] = func(*unit)
+            except Exception as error:
+                errors.append(error)
+                continue
+            callback(results[i])
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            futures = {executor.submit(func, *unit): i for i, unit in enumerate(units)}
+            for future in as_completed(futures):
+                try:
+                    results[futures[future]] = future.result()
+                except Exception as error:
+                    errors.append(error)
+                    continue
+                callback(results[futures[future]])
+    if len(errors) > 0:
+        raise errors[0]
+    return results
+
+
+def evaluate(dataset, pipeline_factory, subjects=None, run='run_3',
+             n_splits=5, scoring='roc_auc', n_jobs=1, epoch_params=None,
+             store=None, pipeline=None):
+    """within-session cross-validation over subjects and sessions
+
+    Every (subject, session, fold) triplet is an independent unit of work,
+    so the units are spread over a pool of ``n_jobs`` worker processes.
+
+    Parameters
+    ----------
+    dataset : BrainInvaders2013
+        Dataset instance whose experimental conditions select the runs.
+    pipeline_factory : callable
+        Called without arguments in the worker to build a fresh, unfitted
+        estimator for every fold. It must be picklable, e.g. a function
+        defined at module level.
+    subjects : None | list of int
+        Subjects to evaluate. If None, ``dataset.subject_list`` is used.
+    run : str
+        Name of the run evaluated within each session.
+    n_splits : int
+        Number of stratified folds.
+    scoring : str
+        Scikit-learn scorer name.
+    n_jobs : int
+        Number of worker processes. Negative values count back from the
+        number of CPUs, as in scikit-learn (-1 uses all of them).
+    epoch_params : None | dict
+        Filter band and window passed to ``dataset.get_epochs``. As the
+        epochs are cached on disk, the folds of a run share one filtering
+        and epoching pass: with several workers, the runs are first
+        epoched into the store, one unit per run, before their folds are
+        scored.
+    store : None | ResultStore
+        Store where every fold is appended as soon as it is scored. The
+        folds already stored for the same pipeline name, number of folds,
+        scorer, epoching parameters and dtype of the dataset are not
+        scored again, so an interrupted evaluation can be resumed by
+        running it again.
+    pipeline : None | str
+        Name of the pipeline in the store. If None, the name of
+        pipeline_factory is used.
+
+    Returns
+    -------
+    scores : pandas.DataFrame
+        One row per fold with the columns subject, session, run, fold and
+        score, sorted by subject, session and fold whatever the order in
+        which the units completed.
+    """
+
+    if subjects is None:
+        subjects = dataset.subject_list
+    if epoch_params is None:
+        epoch_params = {}
+
+    # downloads happen here, once, rather than concurrently in the workers
+    units = []
+    for subject in subjects:
+        sessions = dataset._get_single_subject_data(subject)
+        for session in sorted(sessions.keys()):
+            if run not in sessions[session]:
+                continue
+            for fold in range(n_splits):
+                units.append((subject, session, run, fold))
+    dataset.enforce_storage(keep=subjects)
+
+    done, callback = {}, None
+    if store is not None:
+        if pipeline is None:
+            pipeline = pipeline_factory.__name__
+        params = _store_params(dataset, epoch_params)
+        done = store.done(pipeline, n_splits, scoring, params)
+
+        def callback(row):
+            store.append(pipeline, n_splits, scoring, params, [row])
+
+    # concurrent folds of a run would all miss the store and epoch the run
+    pending = [unit for unit in units if unit not in done]
+    if _n_workers(n_jobs) > 1 and epoch_params.get('use_cache', True):
+        selected = sorted(set(unit[:3] for unit in pending))
+        _run_units(_epoch_unit, [(dataset,) + unit + (epoch_params,) for unit in selected], n_jobs)
+
+    args = (n_splits, scoring, epoch_params)
+    rows = _run_units(_evaluate_unit, [(dataset, pipeline_factory) + unit + args
+                                       for unit in pending],
+                      n_jobs, callback)
+    rows = rows + [list(unit) + [done[unit]] for unit in units if unit in done]
+    dataset.enforce_storage()
+
+    scores = pd.DataFrame(rows, columns=RESULT_COLUMNS)
+    scores = scores.sort_values(['subject', 'session', 'fold'])
+    return scores.reset_index(drop=True)
+
+
+def summarize(scores):
+    """average the fold scores of each subject and session"""
+    summary = scores.groupby(['subject', 'session', 'run'], sort=True)['score']
+    return summary.mean().reset_index()
+
+
+def _compare_unit(dataset, pipelines, subject, session, run, pending, n_splits,
+                  scoring, epoch_params):
+    """score the pending folds of several pipelines on one run, epoched once"""
+
+    X, y, _ = dataset.get_epochs(subject, session, run, **epoch_params)
+    X = X.astype(np.float64, copy=False)
+
+    folds = list(StratifiedKFold(n_splits=n_splits).split(X, y))
+    scorer = get_scorer(scoring)
+    rows = []
+    for name, pipeline_factory in pipelines:
+        for fold in pending[name]:
+            train, test = folds[fold]
+            clf = pipeline_factory()
+            clf.fit(X[train], y[train])
+            rows.append([name, subject, session, run, fold, scorer(clf, X[test], y[test])])
+
+    return rows
+
+
+def compare(dataset, pipelines, subjects=None, run='run_3', n_splits=5,
+            scoring='roc_auc', n_jobs=1, epoch_params=None, store=None):
+    """within-session cross-validation of several pipelines on the same folds
+
+    Every (subject, session) run is a unit of work that loads its epochs
+    once and scores all the pipelines on the same stratified folds as
+    :func:`evaluate`, so the loading and epoching cost does not grow with
+    the number of pipelines. The units are spread over ``n_jobs`` worker
+    processes.
+
+    Parameters
+    ----------
+    dataset : BrainInvaders2013
+        Dataset instance whose experimental conditions select the runs.
+    pipelines : dict
+        Maps the name of every pipeline to its factory, called without
+        arguments in the worker to build a fresh, unfitted estimator for
+        every fold. The factories must be picklable.
+    subjects : None | list of int
+        Subjects to evaluate. If None, ``dataset.subject_list`` is used.
+    run : str
+        Name of the run evaluated within each session.
+    n_splits : int
+        Number of stratified folds.
+    scoring : str
+        Scikit-learn scorer name.
+    n_jobs : int
+        Number of worker processes, as in :func:`evaluate`.
+    epoch_params : None | dict
+        Filter band and window passed to ``dataset.get_epochs``.
+    store : None | ResultStore
+        Store where the scores of every run are appended as soon as it is
+        done, under the names of the pipelines, as in :func:`evaluate`.
+        The folds already stored are not scored again, and a run whose
+        folds are all stored is not loaded at all.
+
+    Returns
+    -------
+    scores : pandas.DataFrame
+        One row per pipeline and fold with the columns pipeline, subject,
+        session, run, fold and score, sorted by pipeline, subject, session
+        and fold. See :func:`compare_table` for a side-by-side summary.
+    """
+
+    if subjects is None:
+        subjects = dataset.subject_list
+    if epoch_params is None:
+        epoch_params = {}
+    pipelines = list(pipelines.items())
+
+    done, callback = {}, None
+    if store is not None:
+        params = _store_params(dataset, epoch_params)
+        done = {name: store.done(name, n_splits, scoring, params)
+                for name, _ in pipelines}
+
+        def callback(rows):
+            for name, _ in pipelines:
+                store.append(name, n_splits, scoring, params,
+                             [row[1:] for row in rows if row[0] == name])
+
+    units, rows = [], []
+    for subject in subjects:
+        sessions = dataset._get_single_subject_data(subject)
+        for session in sorted(sessions.keys()):
+            if run not in sessions[session]:
+                continue
+            pending = {}
+            for name, _ in pipelines:
+                stored = done.get(name, {})
+                pending[name] = [fold for fold in range(n_splits)
+                                 if (subject, session, run, fold) not in stored]
+                rows = rows + [[name, subject, session, run, fold, stored[(subject, session, run, fold)]]
+                               for fold in range(n_splits) if (subject, session, run, fold) in stored]
+            if sum(len(folds) for folds in pending.values()) > 0:
+                units.append((dataset, pipelines, subject, session, run, pending,
+                              n_splits, scoring, epoch_params))
+    dataset.enforce_storage(keep=subjects)
+
+    for unit_rows in _run_units(_compare_unit, units, n_jobs, callback):
+        rows = rows + unit_rows
+    dataset.enforce_storage()
+
+    scores = pd.DataFrame(rows, columns=COMPARE_COLUMNS)
+    scores = scores.sort_values(['pipeline', 'subject', 'session', 'fold'])
+    return scores.reset_index(drop=True)
+
+
+def compare_table(scores):
+    """side-by-side fold-averaged scores of the pipelines
+
+    Returns a DataFrame indexed by subject, session and run with one
+    column per pipeline, in the order in which they first appear in
+    scores, followed by a row 'mean' averaging every column.
+    """
+
+    order = list(pd.unique(scores['pipeline']))
+    table = scores.pivot_table(index=['subject', 'session', 'run'], columns='pipeline',
+                               values='score', aggfunc='mean')[order]
+    table.columns.name = None
+    table.loc[('mean', '', ''), :] = table.mean()
+    return table
+
+
+def _evaluate_adaptive_unit(dataset, subject, session, run, epoch_params,
+                            n_calibration, forgetting, refit_every):
+    """replay one run epoch by epoch through an adaptive classifier
+
+    With refit_every, the epochs scored by the adaptive classifier are also
+    scored by an ERPCovariances + MDM pipeline fitted on all the previous
+    epochs, refitted every refit_every epochs.
+    """
+
+    X, y, _ = dataset.get_epochs(subject, session, run, **epoch_params)
+    X = X.astype(np.float64, copy=False)
+
+    clf = AdaptiveERPMDM(n_calibration, forgetting)
+    scores, refit_scores, labels, durations = [], [], [], []
+    refit, fitted = None, 0
+    for i, (x, label) in enumerate(zip(X, y)):
+        if clf.is_ready:
+            scores.append(clf.predict_proba(x[np.newaxis])[0, 1])
+            labels.append(label)
+            if refit_every is not None:
+                if refit is None or i - fitted >= refit_every:
+                    refit = make_pipeline(ERPCovariances(estimator='lwf', classes=[1]), MDM())
+                    refit.fit(X[:i], y[:i])
+                    fitted = i
+                refit_scores.append(refit.predict_proba(x[np.newaxis])[0, 1])
+        start = time.perf_counter()
+        clf.update(x, label)
+        durations.append(time.perf_counter() - start)
+
+    score, refit_score = np.nan, np.nan
+    if len(set(labels)) == 2:
+        score = roc_auc_score(labels, scores)
+        if refit_every is not None:
+            refit_score = roc_auc_score(labels, refit_scores)
+    return [subject, session, run, score, refit_score, len(y), len(scores), np.mean(durations)]
+
+
+def evaluate_adaptive(dataset, subjects=None, run='run_3', n_jobs=1,
+                      epoch_params=None, n_calibration=10, forgetting=None,
+                      refit_every=None):
+    """prequential evaluation of an adaptive ERP covariance + MDM classifier
+
+    The epochs of every run are presented in their recording order: each
+    one is first scored by the classifier learnt from the previous epochs
+    and then used to update it with :class:`AdaptiveERPMDM`, without ever
+    refitting on the history. Runs are spread over ``n_jobs`` processes.
+    The cost of this approximation can be measured against a pipeline
+    refitted on the history, with refit_every.
+
+    Parameters
+    ----------
+    dataset : BrainInvaders2013
+        Dataset instance whose experimental conditions select the runs,
+        e.g. ``BrainInvaders2013(NonAdaptive=False, Adaptive=True)``.
+    subjects : None | list of int
+        Subjects to evaluate. If None, ``dataset.subject_list`` is used.
+    run : str
+        Name of the run evaluated within each session.
+    n_jobs : int
+        Number of worker processes, as in :func:`evaluate`.
+    epoch_params : None | dict
+        Filter band and window passed to ``dataset.get_epochs``.
+    n_calibration, forgetting : int, None | float
+        Parameters of :class:`AdaptiveERPMDM`.
+    refit_every : None | int
+        If not None, the epochs are also scored by an ERPCovariances + MDM
+        pipeline fitted on all the previous epochs of the run and refitted
+        every refit_every epochs, a costly baseline for the adaptive
+        classifier.
+
+    Returns
+    -------
+    scores : pandas.DataFrame
+        One row per run with the AUC of the scores given before each
+        update, the AUC of the refitted baseline on the same epochs (NaN
+        without refit_every), the number of epochs and of scored epochs,
+        and the mean duration of an update in seconds, sorted by subject
+        and session.
+    """
+
+    if subjects is None:
+        subjects = dataset.subject_list
+    if epoch_params is None:
+        epoch_params = {}
+
+    units = []
+    for subject in subjects:
+        sessions = dataset._get_single_subject_data(subject)
+        for session in sorted(sessions.keys()):
+            if run in sessions[session]:
+                units.append((dataset, subject, session, run, epoch_params,
+                              n_calibration, forgetting, refit_every))
+    dataset.enforce_storage(keep=subjects)
+
+    rows = _run_units(_evaluate_adaptive_unit, units, n_jobs)
+    dataset.enforce_storage()
+    scores = pd.DataFrame(rows, columns=ADAPTIVE_COLUMNS)
+    scores = scores.sort_values(['subject', 'session'])
+    return scores.reset_index(drop=True)
+
+
+def _epoch_products(X):
+    """return the products of the centered epochs that no prototype enters
+
+    Returns, for every epoch, the product of its centered samples with
+    themselves, of shape (n_channels, n_channels), and the sum over the
+    channels of its squared centered samples, of shape (n_times,).
+    """
+
+    Xc = X - X.mean(axis=-1, keepdims=True, dtype=np.float64)
+    return np.matmul(Xc, Xc.transpose(0, 2, 1)), (Xc ** 2).sum(axis=1)
+
+
+def _erp_covariances(prototype, X, XX, q):
+    """ERP covariances of epochs with a prototype, from their cached products
+
+    This equals ``covariances_EP(X, prototype, estimator='lwf')``, i.e. the
+    covariance of the prototype stacked over every epoch shrunk as by
+    sklearn's ledoit_wolf, whose shrinkage only depends on sums over the
+    blocks of the stacked samples. With XX and q from
+    :func:`_epoch_products`, only the block crossing the prototype and the
+    epochs is computed.
+    """
+
+    n_times = X.shape[-1]
+    P = prototype - prototype.mean(axis=-1, keepdims=True)
+    n_proto, n_channels = len(P), X.shape[1]
+    n_features = n_proto + n_channels
+
+    # the prototype is centered, so it needs not be crossed with centered epochs
+    S = np.empty((len(X), n_features, n_features))
+    S[:, :n_proto, :n_proto] = np.dot(P, P.T)
+    S[:, :n_proto, n_proto:] = np.einsum('ct,ndt->ncd', P, X)
+    S[:, n_proto:, :n_proto] = S[:, :n_proto, n_proto:].transpose(0, 2, 1)
+    S[:, n_proto:, n_proto:] = XX
+    S /= n_times
+
+    qP = (P ** 2).sum(axis=0)
+    trace = np.trace(S, axis1=1, axis2=2)
+    mu = trace / n_features
+    beta_ = np.dot(qP, qP) + 2 * np.dot(q, qP) + (q ** 2).sum(axis=1)
+    delta_ = (S ** 2).sum(axis=(1, 2))
+    beta = (beta_ / n_times - delta_) / (n_features * n_times)
+    delta = (delta_ - 2 * mu * trace + n_features * mu ** 2) / n_features
+    beta = np.minimum(beta, delta)
+    shrinkage = np.divide(beta, delta, out=np.zeros_like(beta), where=beta != 0)
+
+    S *= (1 - shrinkage)[:, np.newaxis, np.newaxis]
+    S[:, np.arange(n_features), np.arange(n_features)] += (shrinkage * mu)[:, np.newaxis]
+    return S
+
+
+def _evaluate_transfer_unit(folder, y, train, test, prototype, scheme, subject,
+                            session, classifier_factory, chunk_size=1024):
+    """fit and score one split on the ERP covariances of its prototype"""
+
+    X = np.load(os.path.join(folder, 'epochs.npy'), mmap_mode='r')
+    XX = np.load(os.path.join(folder, 'products.npy'), mmap_mode='r')
+    q = np.load(os.path.join(folder, 'squares.npy'), mmap_mode='r')
+
+    def covariances(index):
+        return np.concatenate([_erp_covariances(prototype, X[chunk], XX[chunk], q[chunk])
+                               for chunk in np.array_split(index, max(len(index) // chunk_size, 1))])
+
+    clf = classifier_factory()
+    clf.fit(covariances(train), y[train])
+    score = roc_auc_score(y[test], clf.predict_proba(covariances(test))[:, 1])
+    return [scheme, subject, session, score, len(train), len(test)]
+
+
+def evaluate_transfer(dataset, scheme='session', subjects=None, run='run_3',
+                      n_jobs=1, epoch_params=None, classifier_factory=MDM,
+                      folder=None):
+    """leave-one-session-out or leave-one-subject-out evaluation
+
+    Every split fits and scores its classifier on ERP covariance matrices
+    whose prototype is the mean Target epoch of its training epochs, for
+    the training and the test epochs alike, so the labels of the test
+    epochs never enter the features and both sets of epochs share the
+    same feature space.
+
+    The prototype changes with the split, but most of the ``lwf``
+    estimation does not depend on it: the product of every centered epoch
+    with itself is computed once and written, along with the epochs, to
+    memory-mapped arrays shared by the worker processes. Every split then
+    only computes the block crossing its prototype and the epochs, see
+    :func:`_erp_covariances`.
+
+    Parameters
+    ----------
+    dataset : BrainInvaders2013
+        Dataset instance whose experimental conditions select the runs.
+    scheme : 'session' | 'subject'
+        'session' leaves out each session of a subject in turn and trains
+        on the other sessions of the same subject; subjects with a single
+        session are skipped. 'subject' leaves out each subject in turn and
+        trains on all the others.
+    subjects : None | list of int
+        Subjects to evaluate. If None, ``dataset.subject_list`` is used.
+    run : str
+        Name of the run used within each session.
+    n_jobs : int
+        Number of worker processes, as in :func:`evaluate`.
+    epoch_params : None | dict
+        Filter band and window passed to ``dataset.get_epochs``.
+    classifier_factory : callable
+        Called without arguments to build a fresh classifier working on
+        covariance matrices for every split. It must be picklable.
+    folder : None | str
+        Where the memory-mapped arrays are written. If None, a temporary
+        folder is used and removed afterwards.
+
+    Returns
+    -------
+    scores : pandas.DataFrame
+        One row per split with the scheme, the subject and session left
+        out (session is None for the subject scheme), the AUC and the
+        numbers of training and test epochs.
+    """
+
+    if scheme not in ['session', 'subject']:
+        raise(ValueError("scheme must be 'session' or 'subject'"))
+    if subjects is None:
+        subjects = dataset.subject_list
+    if epoch_params is None:
+        epoch_params = {}
+
+    # first pass: labels, groups and Target sums of every group
+    labels, metadata = [], []
+    target_sums = {}
+    shape, dtype = None, None
+    for subject in subjects:
+        X, y, meta = dataset.get_epochs(subject, run=run, **epoch_params)
+        shape, dtype = X.shape[1:], X.dtype
+        for session in meta['session'].unique():
+            mask = (meta['session'] == session).values
+            group = (subject, session) if scheme == 'session' else subject
+            total, count = target_sums.get(group, (0., 0))
+            target_sums[group] = (total + X[mask & (y == 1)].sum(axis=0, dtype=np.float64),
+                                  count + int((mask & (y == 1)).sum()))
+        labels.append(y)
+        metadata.append(meta)
+    y = np.concatenate(labels)
+    metadata = pd.concat(metadata, ignore_index=True)
+
+    def training_groups(group):
+        if scheme == 'session':
+            return [other for other in target_sums if other[0] == group[0] and other != group]
+        return [other for other in target_sums if other != group]
+
+    remove_folder = folder is None
+    if folder is None:
+        folder = tempfile.mkdtemp(prefix='braininvaders2013-')
+    try:
+        # second pass: the epochs and their products, in the order of y
+        n_channels, n_times = shape
+        epochs = np.lib.format.open_memmap(os.path.join(folder, 'epochs.npy'), mode='w+',
+                                           dtype=dtype, shape=(len(y),) + shape)
+        products = np.lib.format.open_memmap(os.path.join(folder, 'products.npy'), mode='w+',
+                                             dtype=np.float64, shape=(len(y), n_channels, n_channels))
+        squares = np.lib.format.open_memmap(os.path.join(folder, 'squares.npy'), mode='w+',
+                                            dtype=np.float64, shape=(len(y), n_times))
+        offset = 0
+        for subject in subjects:
+            X, _, _ = dataset.get_epochs(subject, run=run, **epoch_params)
+            epochs[offset:offset + len(X)] = X
+            products[offset:offset + len(X)], squares[offset:offset + len(X)] = _epoch_products(X)
+            offset += len(X)
+        for array in [epochs, products, squares]:
+            array.flush()
+        del epochs, products, squares
+
+        units = []
+        for group in sorted(target_sums):
+            others = training_groups(group)
+            if len(others) == 0:
+                continue
+            prototype = (sum(target_sums[other][0] for other in others)
+                         / sum(target_sums[other][1] for other in others))
+            if scheme == 'session':
+                subject, session = group
+                is_test = ((metadata['subject'] == subject) & (metadata['session'] == session)).values
+                is_train = (metadata['subject'] == subject).values & ~is_test
+            else:
+                subject, session = group, None
+                is_test = (metadata['subject'] == subject).values
+                is_train = ~is_test
+            units.append((folder, y, np.flatnonzero(is_train), np.flatnonzero(is_test), prototype,
+                          scheme, subject, session, classifier_factory))
+
+        rows = _run_units(_evaluate_transfer_unit, units, n_jobs)
+    finally:
+        if remove_folder:
+            shutil.rmtree(folder, ignore_errors=True)
+    dataset.enforce_storage()
+
+    return pd.DataFrame(rows, columns=TRANSFER_COLUMNS)
@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+import json
+import time
+import sqlite3
+
+COLUMNS = ['subject', 'session', 'run', 'condition', 'type', 'path',
+           'archive', 'member', 'n_samples']
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS subjects (
+    subject INTEGER NOT NULL,
+    extract INTEGER NOT NULL,
+    signature TEXT NOT NULL,
+    PRIMARY KEY (subject, extract)
+);
+CREATE TABLE IF NOT EXISTS runs (
+    subject INTEGER NOT NULL,
+    extract INTEGER NOT NULL,
+    session TEXT NOT NULL,
+    run TEXT NOT NULL,
+    condition TEXT NOT NULL,
+    type TEXT NOT NULL,
+    path TEXT NOT NULL,
+    archive TEXT,
+    member TEXT,
+    n_samples INTEGER
+);
+CREATE INDEX IF NOT EXISTS runs_selection
+    ON runs (subject, extract, condition, type);
+CREATE TABLE IF NOT EXISTS usage (
+    subject INTEGER PRIMARY KEY,
+    last_used REAL NOT NULL
+);
+'''
+
+
+class RunIndex(object):
+    """SQLite table of every run of the dataset
+
+    The index holds one row per run with its subject, session, run name,
+    experimental condition, type, location and number of samples, so that
+    selecting runs is a query instead of parsing meta.yml and globbing the
+    session folders. Subjects are indexed separately for extracted runs
+    and for runs read from the archives, and every subject is stored with
+    a signature of its archives so that a stale entry can be detected.
+    The time at which every subject was last selected is also kept, for
+    the eviction of the least recently used subjects.
+
+    Parameters
+    ----------
+    path : str
+        Location of the SQLite database, created when needed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=30.)
+        connection.executescript(SCHEMA)
+        return connection
+
+    def signature(self, subject, extract):
+        """return the archive signature a subject was indexed with, or None"""
+
+        connection = self._connect()
+        try:
+            row = connection.execute(
+                'SELECT signature FROM subjects WHERE subject = ? AND extract = ?',
+                (subject, int(extract))).fetchone()
+        finally:
+            connection.close()
+        return None if row is None else json.loads(row[0])
+
+    def replace(self, subject, extract, signature, rows):
+        """(re)index the runs of a subject
+
+        Parameters
+        ----------
+        subject : int
+            Subject number.
+        extract : bool
+            Whether the rows locate extracted runs or archive members.
+        signature : list
+            JSON serializable description of the archives of the subject.
+        rows : list of dict
+            One dict per run with the keys of ``COLUMNS``.
+        """
+
+        connection = self._connect()
+        try:
+            with connection:
+                connection.execute('DELETE FROM runs WHERE subject = ? AND extract = ?',
+                                   (subject, int(extract)))
+                connection.executemany(
+                    'INSERT INTO runs (extract, {}) VALUES (?, {})'.format(
+                        ', '.join(COLUMNS), ', '.join(['?'] * len(COLUMNS))),
+                    [[int(extract)] + [row[column] for column in COLUMNS] for row in rows])
+                connection.execute('INSERT OR REPLACE INTO subjects VALUES (?, ?, ?)',
+                                   (subject, int(extract), json.dumps(signature)))
+        finally:
+            connection.close()
+
+    def drop(self, subject):
+        """remove a subject from the index"""
+
+        connection = self._connect()
+        try:
+            with connection:
+                connection.execute('DELETE FROM runs WHERE subject = ?', (subject,))
+                connection.execute('DELETE FROM subjects WHERE subject = ?', (subject,))
+                connection.execute('DELETE FROM usage WHERE subject = ?', (subject,))
+        finally:
+            connection.close()
+
+    def touch(self, subjects, when=None, resolution=0.):
+        """record that some subjects are used now, or at the time when
+
+        The subjects whose recorded time is less than resolution seconds
+        before when are left as they are, and the index is not written at
+        all when every subject is, so that frequent lookups of the same
+        subjects, e.g. from concurrent worker processes, do not contend
+        for the write lock of the database.
+        """
+
+        when = time.time() if when is None else when
+        if resolution > 0:
+            last_used = self.last_used()
+            subjects = [subject for subject in subjects
+                        if when - last_used.get(subject, float('-inf')) >= resolution]
+            if len(subjects) == 0:
+                return
+        connection = self._connect()
+        try:
+            with connection:
+                connection.executemany('INSERT OR REPLACE INTO usage VALUES (?, ?)',
+                                       [(subject, when) for subject in subjects])
+        finally:
+            connection.close()
+
+    def last_used(self):
+        """return the time at which every subject was last used, as a dict"""
+
+        connection = self._connect()
+        try:
+            rows = connection.execute('SELECT subject, last_used FROM usage').fetchall()
+        finally:
+            connection.close()
+        return dict(rows)
+
+    def select(self, subjects, extract, conditions, types):
+        """return the runs of some subjects under the given conditions and types
+
+        The runs are returned as dicts with the keys of ``COLUMNS``, ordered
+        by subject and then in the order in which they were indexed.
+        """
+
+        subjects, conditions, types = list(subjects), list(conditions), list(types)
+        query = ('SELECT {} FROM runs WHERE extract = ? '
+                 'AND subject IN ({}) AND condition IN ({}) AND type IN ({}) '
+                 'ORDER BY subject, rowid').format(
+                     ', '.join(COLUMNS),
+                     ', '.join(['?'] * len(subjects)),
+                     ', '.join(['?'] * len(conditions)),
+                     ', '.join(['?'] * len(types)))
+
+        connection = self._connect()
+        try:
+            rows = connection.execute(
+                query, [int(extract)] + subjects + conditions + types).fetchall()
+        finally:
+            connection.close()
+        return [dict(zip(COLUMNS, row)) for row in rows]
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+"""Timing and byte counts of the loading and preprocessing stages.
+
+The stages of ``BrainInvaders2013`` (download, unzip, yaml, index,
+loadmat, cache_write, raw_array, filter, epoch) report their duration and
+the number of bytes they handled to the registered hooks. A hook is any
+callable taking ``(stage, duration, n_bytes)``; :func:`record` registers a
+:class:`Recorder` for the duration of a with block::
+
+    with record() as recorder:
+        dataset.get_epochs(1)
+    print(recorder.report())
+
+While no hook is registered, entering a stage only costs a check of an
+empty list. Hooks are called in the thread running the stage; stages run
+in worker processes, e.g. by ``evaluation.evaluate`` with ``n_jobs > 1``,
+are not reported to the hooks of the parent process.
+"""
+
+import time
+import threading
+from contextlib import contextmanager
+
+REPORT_COLUMNS = ['stage', 'calls', 'total_time', 'mean_time', 'max_time',
+                  'bytes', 'throughput']
+
+_hooks = []
+
+
+def add_hook(hook):
+    """call hook(stage, duration, n_bytes) at the end of every stage"""
+    _hooks.append(hook)
+
+
+def remove_hook(hook):
+    """stop calling a hook registered with :func:`add_hook`"""
+    _hooks.remove(hook)
+
+
+class _NullStage(object):
+    """stage returned while no hook is registered, which measures nothing"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def add_bytes(self, n_bytes):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage(object):
+
+    def __init__(self, name, n_bytes):
+        self.name = name
+        self.n_bytes = n_bytes
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        duration = time.perf_counter() - self._start
+        for hook in list(_hooks):
+            hook(self.name, duration, self.n_bytes)
+        return False
+
+    def add_bytes(self, n_bytes):
+        """count bytes handled by the stage, e.g. once they are known"""
+        self.n_bytes += n_bytes
+
+
+def stage(name, n_bytes=0):
+    """return a context manager reporting a stage to the hooks
+
+    The bytes handled by the stage can be given upfront or counted within
+    the with block with ``add_bytes``.
+    """
+
+    if len(_hooks) == 0:
+        return _NULL_STAGE
+    return _Stage(name, n_bytes)
+
+
+class Recorder(object):
+    """hook keeping every reported stage, thread-safe
+
+    Attributes
+    ----------
+    events : list of tuple
+        The (stage, duration, n_bytes) triplets, in order of completion.
+    """
+
+    def __init__(self):
+        self.events = []
+        self._lock = threading.Lock()
+
+    def __call__(self, stage, duration, n_bytes):
+        with self._lock:
+            self.events.append((stage, duration, n_bytes))
+
+    def clear(self):
+        with self._lock:
+            self.events = []
+
+    def report(self):
+        """aggregate the events per stage
+
+        Returns
+        -------
+        report : pandas.DataFrame
+            One row per stage, in order of first completion, with the
+            number of calls, the total, mean and maximum durations in
+            seconds, the total bytes and the throughput in bytes per
+            second.
+        """
+
+        import pandas as pd
+
+        with self._lock:
+            events = pd.DataFrame(list(self.events), columns=['stage', 'duration', 'bytes'])
+        order = list(pd.unique(events['stage']))
+        grouped = events.groupby('stage', sort=False)
+        report = pd.DataFrame({'stage': order,
+                               'calls': grouped['duration'].count().reindex(order).values,
+                               'total_time': grouped['duration'].sum().reindex(order).values,
+                               'mean_time': grouped['duration'].mean().reindex(order).values,
+                               'max_time': grouped['duration'].max().reindex(order).values,
+                               'bytes': grouped['bytes'].sum().reindex(order).values},
+                              columns=REPORT_COLUMNS[:-1])
+        report['throughput'] = report['bytes'] / report['total_time']
+        return report
+
+
+@contextmanager
+def record(recorder=None):
+    """register a Recorder as hook for the duration of a with block"""
+
+    if recorder is None:
+        recorder = Recorder()
+    add_hook(recorder)
+    try:
+        yield recorder
+    finally:
+        remove_hook(recorder)
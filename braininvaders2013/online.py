@@ -0,0 +1,277 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+import time
+from collections import deque, namedtuple
+
+import numpy as np
+from scipy.signal import butter, sosfilt, sosfilt_zi
+
+from . import cache
+from .dataset import SFREQ, EVENT_ID, epoch_array
+
+Flash = namedtuple('Flash', ['sample', 'code', 'score', 'latency'])
+Flash.__doc__ = '''score of one flash emitted by the streaming decoder
+
+sample is the onset of the flash in samples since the start of the stream,
+code its stimulation code, score the Target probability given by the
+classifier and latency the wall-clock time in seconds between the arrival
+of the last sample of its epoch and the emission of the score.'''
+
+
+class RingBuffer(object):
+    """fixed-size buffer of the most recent samples of a stream
+
+    Samples are addressed by their absolute index since the start of the
+    stream; only the last ``size`` samples can be read back.
+
+    Parameters
+    ----------
+    n_channels : int
+        Number of channels.
+    size : int
+        Number of samples kept.
+    dtype : numpy dtype
+        Type of the samples.
+    """
+
+    def __init__(self, n_channels, size, dtype=np.float64):
+        self._data = np.zeros((n_channels, size), dtype=dtype)
+        self.size = size
+        self.n_samples = 0
+
+    def append(self, chunk):
+        """append a chunk of shape (n_channels, n_times)"""
+
+        n_total = chunk.shape[1]
+        chunk = chunk[:, -self.size:]
+        n_times = chunk.shape[1]
+        start = (self.n_samples + n_total - n_times) % self.size
+        first = min(n_times, self.size - start)
+        self._data[:, start:start + first] = chunk[:, :first]
+        self._data[:, :n_times - first] = chunk[:, first:]
+        self.n_samples += n_total
+
+    def get(self, start, stop):
+        """return the samples with absolute indices in [start, stop)"""
+
+        if stop > self.n_samples or start < self.n_samples - self.size:
+            raise ValueError('samples {}-{} are not in the buffer, which holds '
+                             '{}-{}'.format(start, stop, max(self.n_samples - self.size, 0),
+                                            self.n_samples))
+        indices = np.arange(start, stop) % self.size
+        return self._data[:, indices]
+
+
+class CausalFilter(object):
+    """Butterworth band-pass filter applied chunk by chunk
+
+    Unlike the zero-phase filter of the offline analysis, this filter only
+    depends on past samples, so chunks can be filtered as they arrive while
+    giving the same output as filtering the whole stream at once.
+    """
+
+    def __init__(self, n_channels, fmin=1, fmax=24, sfreq=SFREQ, order=4):
+        nyquist = sfreq / 2.
+        self.sos = butter(order, [fmin / nyquist, fmax / nyquist],
+                          btype='bandpass', output='sos')
+        self.n_channels = n_channels
+        self.reset()
+
+    def reset(self):
+        self._zi = None
+
+    def __call__(self, chunk):
+        if self._zi is None:
+            zi = sosfilt_zi(self.sos)
+            self._zi = np.repeat(zi[:, np.newaxis, :], self.n_channels, axis=1) * chunk[:, 0][np.newaxis, :, np.newaxis]
+        filtered, self._zi = sosfilt(self.sos, chunk, axis=-1, zi=self._zi)
+        return filtered
+
+
+class StreamingDecoder(object):
+    """score the flashes of a stream of P300 data as its samples arrive
+
+    Chunks of samples shaped like the runs of the dataset (16 EEG channels
+    then the stim channel) are pushed into the decoder. The EEG channels
+    are band-pass filtered causally and kept in a ring buffer, the 33285
+    and 33286 stimulation codes are detected across chunk boundaries, and
+    every flash is scored as soon as the last sample of its epoch has been
+    received, so a score is emitted at most one chunk after ``tmax``.
+
+    Parameters
+    ----------
+    classifier : estimator
+        Scikit-learn compatible estimator taking epochs of shape
+        (n_epochs, 16, n_times) and implementing predict_proba, e.g. the
+        ERPCovariances + MDM pipeline of classification_scores.py. It can
+        be calibrated on a stored run with :meth:`fit`.
+    fmin, fmax : float
+        Band of the causal filter, in Hz.
+    tmin, tmax : float
+        Window of the epochs around the stimulations, in seconds.
+    sfreq : float
+        Sampling frequency of the stream, in Hz.
+    buffer_seconds : float
+        Duration of the ring buffer, which must hold a whole epoch plus the
+        largest chunk.
+    """
+
+    def __init__(self, classifier, fmin=1, fmax=24, tmin=0.0, tmax=1.0,
+                 sfreq=SFREQ, buffer_seconds=10.):
+        self.classifier = classifier
+        self.fmin, self.fmax = fmin, fmax
+        self.tmin, self.tmax = tmin, tmax
+        self.sfreq = sfreq
+        self.buffer_seconds = buffer_seconds
+        self._offset = int(round(tmin * sfreq))
+        self._n_times = int(round(tmax * sfreq)) - self._offset + 1
+        self.reset()
+
+    def reset(self):
+        """forget the samples received so far"""
+
+        self._buffer = None
+        self._filter = None
+        self._last_stim = None
+        self._pending = deque()
+
+    @property
+    def n_samples(self):
+        """number of samples received so far"""
+        return 0 if self._buffer is None else self._buffer.n_samples
+
+    def _epochs(self, data):
+        """causally filter a stored run and cut it into labelled epochs"""
+
+        eeg = CausalFilter(len(data) - 1, self.fmin, self.fmax, self.sfreq)(data[:-1])
+        samples, codes = cache.stim_onsets(data[-1])
+        X, kept = epoch_array(eeg, samples, self.tmin, self.tmax, self.sfreq)
+        y = (codes[kept] == EVENT_ID['Target']).astype(int)
+        return X, y
+
+    def fit(self, data):
+        """calibrate the classifier on a stored run
+
+        The run is filtered with the same causal filter as the stream, so
+        that the classifier sees epochs with the same phase distortion.
+
+        Parameters
+        ----------
+        data : ndarray, shape (17, n_samples)
+            A run of the dataset, e.g. ``cache.load_run(file_path)[0]``.
+        """
+
+        X, y = self._epochs(data)
+        self.classifier.fit(X, y)
+        return self
+
+    def push(self, chunk):
+        """add a chunk of samples and return the flashes that can be scored
+
+        Parameters
+        ----------
+        chunk : ndarray, shape (17, n_times)
+            The next samples of the stream, EEG channels then stim channel.
+
+        Returns
+        -------
+        flashes : list of Flash
+            The flashes whose epoch was completed by this chunk, in onset
+            order.
+        """
+
+        arrival = time.perf_counter()
+        chunk = np.asarray(chunk)
+        n_eeg = chunk.shape[0] - 1
+        if self._buffer is None:
+            size = int(self.buffer_seconds * self.sfreq)
+            if size < self._n_times + chunk.shape[1]:
+                raise ValueError('the buffer of {} samples cannot hold an epoch of {} '
+                                 'samples plus a chunk of {}'.format(size, self._n_times, chunk.shape[1]))
+            self._buffer = RingBuffer(n_eeg, size)
+            self._filter = CausalFilter(n_eeg, self.fmin, self.fmax, self.sfreq)
+
+        # detect the onsets, including a step between two chunks
+        first = self._buffer.n_samples
+        stim = chunk[-1]
+        if self._last_stim is None:
+            samples, codes = cache.stim_onsets(stim)
+        else:
+            samples, codes = cache.stim_onsets(np.r_[self._last_stim, stim])
+            samples = samples - 1
+        self._last_stim = stim[-1]
+        for sample, code in zip(samples + first, codes):
+            self._pending.append((sample, code))
+
+        self._buffer.append(self._filter(chunk[:-1]))
+
+        # score every flash whose epoch is complete, in a single batch
+        ready = []
+        while len(self._pending) > 0:
+            sample, code = self._pending[0]
+            start = sample + self._offset
+            if start + self._n_times > self._buffer.n_samples:
+                break
+            self._pending.popleft()
+            if start >= 0:
+                ready.append((sample, code))
+        if len(ready) == 0:
+            return []
+
+        X = np.array([self._buffer.get(sample + self._offset, sample + self._offset + self._n_times)
+                      for sample, _ in ready])
+        scores = self.classifier.predict_proba(X)[:, 1]
+        latency = time.perf_counter() - arrival
+        return [Flash(int(sample), int(code), float(score), latency)
+                for (sample, code), score in zip(ready, scores)]
+
+
+def replay(data, decoder, chunk_size=32, speed=1.):
+    """feed a stored run to a streaming decoder, chunk by chunk
+
+    Parameters
+    ----------
+    data : ndarray, shape (17, n_samples)
+        A run of the dataset.
+    decoder : StreamingDecoder
+        The decoder, already calibrated; it is reset first.
+    chunk_size : int
+        Number of samples per chunk, as sent by an amplifier.
+    speed : float | None
+        Replay speed relative to real time: 1 sends the chunks at the pace
+        of the recording, 10 ten times faster, and None as fast as possible.
+
+    Returns
+    -------
+    flashes : list of Flash
+        The flashes scored by the decoder.
+    stats : dict
+        Number of samples and flashes, wall-clock duration, throughput in
+        samples per second, and median, 95th percentile and maximum of
+        the per-flash latency in seconds.
+    """
+
+    decoder.reset()
+    n_samples = data.shape[1]
+    flashes = []
+    start = time.perf_counter()
+    for first in range(0, n_samples, chunk_size):
+        if speed is not None:
+            # wait until the chunk would have been fully recorded
+            due = start + (first + chunk_size) / (decoder.sfreq * speed)
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        flashes.extend(decoder.push(data[:, first:first + chunk_size]))
+    duration = time.perf_counter() - start
+
+    latencies = np.array([flash.latency for flash in flashes])
+    stats = {'n_samples': n_samples,
+             'n_flashes': len(flashes),
+             'duration': duration,
+             'throughput': n_samples / duration,
+             'latency_median': float(np.median(latencies)) if len(flashes) > 0 else None,
+             'latency_p95': float(np.percentile(latencies, 95)) if len(flashes) > 0 else None,
+             'latency_max': float(latencies.max()) if len(flashes) > 0 else None}
+    return flashes, stats
@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+import os
+
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.backends.backend_pdf import PdfPages
+
+from .dataset import CHNAMES
+from .epochs import EpochSet
+from .evaluation import _run_units
+
+
+def _evoked_unit(dataset, subject, run, channel, window, epoch_params):
+    """average the Target and NonTarget epochs of every session of a subject"""
+
+    epochs = EpochSet.from_dataset(dataset, subject, run=run, **epoch_params).crop(*window)
+    X, y, times = epochs.X, epochs.y, epochs.times
+    index = CHNAMES.index(channel)
+    sessions = epochs.metadata['session'].values
+
+    evoked = []
+    for session in sorted(set(sessions)):
+        mask = sessions == session
+        target = X[mask & (y == 1), index].mean(axis=0, dtype=np.float64)
+        nontarget = X[mask & (y == 0), index].mean(axis=0, dtype=np.float64)
+        evoked.append({'subject': subject, 'session': session,
+                       'times': times,
+                       'target': target, 'nontarget': nontarget})
+    return evoked
+
+
+def compute_evoked(dataset, subjects=None, run='run_3', channel='Cz',
+                   window=(0.0, 0.8), n_jobs=1, epoch_params=None):
+    """average evoked potentials of every subject and session at one channel
+
+    The averages are vectorized means over the epochs of
+    ``dataset.get_epochs``, so the runs are only filtered and epoched when
+    the on-disk store of epochs does not hold them yet. The epochs are
+    cropped to the averaged window, so they can be shared with analyses
+    of a wider window, e.g. the classification of the 0-1 s epochs.
+
+    Parameters
+    ----------
+    dataset : BrainInvaders2013
+        Dataset instance whose experimental conditions select the runs.
+    subjects : None | list of int
+        Subjects to average. If None, ``dataset.subject_list`` is used.
+    run : str
+        Name of the run averaged within each session.
+    channel : str
+        Name of the EEG channel.
+    window : tuple of float
+        Bounds of the averaged window, in seconds, within the window of
+        the epochs.
+    n_jobs : int
+        Number of worker processes, as in :func:`evaluation.evaluate`.
+    epoch_params : None | dict
+        Filter band and window passed to ``dataset.get_epochs``. Defaults
+        to the 1-24 Hz band and epochs from 0 to 1 s.
+
+    Returns
+    -------
+    evoked : list of dict
+        One dict per session, sorted by subject and session, with the
+        subject, the session, the times in seconds and the Target and
+        NonTarget averages.
+    """
+
+    if subjects is None:
+        subjects = dataset.subject_list
+    if epoch_params is None:
+        epoch_params = {'fmin': 1, 'fmax': 24, 'tmin': 0.0, 'tmax': 1.0}
+
+    # downloads happen here, once, rather than concurrently in the workers
+    for subject in subjects:
+        dataset._get_single_subject_data(subject)
+    dataset.enforce_storage(keep=subjects)
+
+    units = [(dataset, subject, run, channel, window, epoch_params) for subject in subjects]
+    evoked = [entry for evoked in _run_units(_evoked_unit, units, n_jobs) for entry in evoked]
+    dataset.enforce_storage()
+    return evoked
+
+
+def _title(entry, channel, score):
+    title = ('Average evoked potentials at electrode ' + channel
+             + ' for subject ' + str(entry['subject']))
+    if score is not None:
+        title = title + ' (AUC : ' + '{:.2f}'.format(score) + ')'
+    return title
+
+
+def plot_evoked(entry, channel='Cz', score=None):
+    """draw the Target and NonTarget averages of one session
+
+    The figure is created without pyplot, on an Agg canvas, so that it is
+    not registered in any global state and is freed as soon as it is no
+    longer referenced, whatever the backend of the calling process.
+
+    Returns
+    -------
+    fig : matplotlib.figure.Figure
+    """
+
+    fig = Figure(facecolor='white', figsize=(10.9, 7.6))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(1, 1, 1)
+    ax.plot(entry['times'], entry['target'], c='#2166ac', lw=3.0, label='Target')
+    ax.plot(entry['times'], entry['nontarget'], c='#b2182b', lw=3.0, label='NonTarget')
+    ax.set_xlim(entry['times'][0], entry['times'][-1])
+    ax.set_title(_title(entry, channel, score))
+    ax.legend()
+    return fig
+
+
+def _render_unit(entry, channel, score, filename):
+    """draw one figure and save it to its own file"""
+
+    fig = plot_evoked(entry, channel, score)
+    fig.savefig(filename, format=os.path.splitext(filename)[1][1:])
+    fig.clf()
+    return filename
+
+
+def _get_score(scores, entry):
+    if scores is None:
+        return None
+    return scores.get(entry['subject'], {}).get(entry['session'])
+
+
+def render_evoked(evoked, folder='evoked_potentials', scores=None, channel='Cz',
+                  n_jobs=1, pdf=None, extension='pdf'):
+    """save one figure per session, and optionally a multi-page PDF
+
+    Figures are drawn in a pool of ``n_jobs`` worker processes, each one
+    saved to ``evoked_potentials_subject_XX_<session>.<extension>`` in
+    folder. With pdf given, every figure is also appended as a page of
+    this single PDF file, in the order of evoked; PdfPages cannot be
+    shared between processes, so these pages are drawn in the calling
+    process.
+
+    Parameters
+    ----------
+    evoked : list of dict
+        Averages as returned by :func:`compute_evoked`.
+    folder : None | str
+        Folder of the individual figures, created when needed. If None,
+        only the multi-page PDF is written.
+    scores : None | dict
+        Classification scores indexed by subject then session, shown in
+        the titles.
+    channel : str
+        Name of the channel, for the titles.
+    n_jobs : int
+        Number of worker processes, as in :func:`evaluation.evaluate`.
+    pdf : None | str
+        Path of the multi-page PDF.
+    extension : str
+        Format of the individual figures.
+
+    Returns
+    -------
+    filenames : list of str
+        The files written, individual figures first.
+    """
+
+    filenames = []
+    if folder is not None:
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+        units = []
+        for entry in evoked:
+            filename = os.path.join(folder, 'evoked_potentials_subject_' + str(entry['subject']).zfill(2)
+                                    + '_' + entry['session'] + '.' + extension)
+            units.append((entry, channel, _get_score(scores, entry), filename))
+        filenames = _run_units(_render_unit, units, n_jobs)
+
+    if pdf is not None:
+        with PdfPages(pdf) as pages:
+            for entry in evoked:
+                fig = plot_evoked(entry, channel, _get_score(scores, entry))
+                pages.savefig(fig)
+                fig.clf()
+        filenames.append(pdf)
+
+    return filenames
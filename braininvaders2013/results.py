@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+import json
+import time
+import sqlite3
+
+import pandas as pd
+
+COLUMNS = ['pipeline', 'subject', 'session', 'run', 'fold', 'score',
+           'n_splits', 'scoring', 'params', 'created']
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS results (
+    pipeline TEXT NOT NULL,
+    subject INTEGER NOT NULL,
+    session TEXT NOT NULL,
+    run TEXT NOT NULL,
+    fold INTEGER NOT NULL,
+    score REAL,
+    n_splits INTEGER NOT NULL,
+    scoring TEXT NOT NULL,
+    params TEXT NOT NULL,
+    created TEXT NOT NULL,
+    PRIMARY KEY (pipeline, n_splits, scoring, params, subject, session, run, fold)
+);
+'''
+
+
+def _params_key(params):
+    """canonical text of a dict of parameters, used as part of the unit keys"""
+    return json.dumps(params if params is not None else {}, sort_keys=True)
+
+
+class ResultStore(object):
+    """append-only SQLite table of cross-validation scores
+
+    Every fold of every subject, session and run is stored as one row as
+    soon as it is scored, together with the name of the pipeline, the
+    number of folds, the scorer and the parameters it was scored with,
+    i.e. the epoching parameters and the dtype of the epochs. Rows are
+    never rewritten, so an interrupted evaluation keeps what it computed
+    and a rerun only scores the missing units.
+
+    Parameters
+    ----------
+    path : str
+        Location of the SQLite database, created when needed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=30.)
+        connection.executescript(SCHEMA)
+        return connection
+
+    def append(self, pipeline, n_splits, scoring, params, rows):
+        """store scored units, ignoring those already in the store
+
+        Parameters
+        ----------
+        pipeline : str
+            Name of the pipeline.
+        n_splits : int
+            Number of folds the units belong to.
+        scoring : str
+            Scorer name.
+        params : None | dict
+            Epoching parameters of the units and dtype of their epochs.
+        rows : list of list
+            One [subject, session, run, fold, score] list per unit.
+        """
+
+        created = time.strftime('%Y-%m-%dT%H:%M:%S')
+        connection = self._connect()
+        try:
+            with connection:
+                connection.executemany(
+                    'INSERT OR IGNORE INTO results ({}) VALUES ({})'.format(
+                        ', '.join(COLUMNS), ', '.join(['?'] * len(COLUMNS))),
+                    [[pipeline, int(subject), session, run, int(fold), float(score),
+                      n_splits, scoring, _params_key(params), created]
+                     for subject, session, run, fold, score in rows])
+        finally:
+            connection.close()
+
+    def done(self, pipeline, n_splits, scoring, params):
+        """return the scores already stored for a pipeline and its settings
+
+        Returns
+        -------
+        scores : dict
+            Score of every stored unit, keyed by (subject, session, run,
+            fold).
+        """
+
+        connection = self._connect()
+        try:
+            rows = connection.execute(
+                'SELECT subject, session, run, fold, score FROM results '
+                'WHERE pipeline = ? AND n_splits = ? AND scoring = ? AND params = ?',
+                (pipeline, n_splits, scoring, _params_key(params))).fetchall()
+        finally:
+            connection.close()
+        return {tuple(row[:4]): row[4] for row in rows}
+
+    def query(self, pipelines=None, subjects=None, sessions=None, runs=None):
+        """return the stored rows as a DataFrame
+
+        Every argument, when not None, is a list restricting the rows to
+        some pipelines, subjects, sessions or runs. The rows are sorted by
+        pipeline, subject, session, run and fold, and params holds the
+        epoching parameters and the dtype of the epochs as JSON text.
+        """
+
+        conditions, values = [], []
+        for column, selected in [('pipeline', pipelines), ('subject', subjects),
+                                 ('session', sessions), ('run', runs)]:
+            if selected is not None:
+                selected = list(selected)
+                conditions.append('{} IN ({})'.format(column, ', '.join(['?'] * len(selected))))
+                values = values + selected
+        query = 'SELECT {} FROM results'.format(', '.join(COLUMNS))
+        if len(conditions) > 0:
+            query = query + ' WHERE ' + ' AND '.join(conditions)
+        query = query + ' ORDER BY pipeline, subject, session, run, fold'
+
+        connection = self._connect()
+        try:
+            rows = connection.execute(query, values).fetchall()
+        finally:
+            connection.close()
+        return pd.DataFrame(rows, columns=COLUMNS)
@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+"""Export of preprocessed epochs into fixed-size shards.
+
+The epochs of the selected subjects are written into numbered ``.npz``
+shards holding the same number of epochs (but the last one), along with
+a ``manifest.json`` describing the preprocessing, the layout of the
+epochs and every shard. Training nodes can then copy only the shards
+assigned to their rank and read them sequentially, without the archives
+or the .mat files::
+
+    python -m braininvaders2013.shards --output shards --shard-size 1024
+
+and, on the node of rank r among n::
+
+    for X, y, metadata in iter_shards('shards', rank=r, world_size=n):
+        ...
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+
+import numpy as np
+
+from .dataset import CHNAMES, SFREQ
+
+SHARD_VERSION = 1
+FIELDS = ['X', 'y', 'subject', 'session', 'run', 'sample']
+
+
+def _sha1(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as stream:
+        for chunk in iter(lambda: stream.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _write_shard(directory, number, arrays):
+    """write one shard atomically and return its manifest entry"""
+
+    filename = 'shard-{:05d}.npz'.format(number)
+    path = os.path.join(directory, filename)
+    with open(path + '.tmp', 'wb') as stream:
+        np.savez(stream, **arrays)
+    os.replace(path + '.tmp', path)
+    return {'file': filename,
+            'n_epochs': len(arrays['y']),
+            'subjects': sorted(int(subject) for subject in set(arrays['subject'])),
+            'bytes': os.path.getsize(path),
+            'sha1': _sha1(path)}
+
+
+def export_shards(dataset, directory, subjects=None, run='run_3', shard_size=1024,
+                  epoch_params=None, n_jobs=1):
+    """write the epochs of some subjects into fixed-size shards
+
+    Subjects are epoched one at a time with ``dataset.get_epochs``, and
+    their epochs are appended to the current shard, which is written as
+    soon as it holds shard_size epochs. The manifest is written last, so
+    a directory with a manifest always holds a complete export.
+
+    Parameters
+    ----------
+    dataset : BrainInvaders2013
+        Dataset instance whose experimental conditions and dtype select
+        the runs and the precision of the epochs.
+    directory : str
+        Folder of the shards, created when needed.
+    subjects : None | list of int
+        Subjects to export. If None, ``dataset.subject_list`` is used.
+    run : None | str
+        Run exported within each session, or every run if None.
+    shard_size : int
+        Number of epochs per shard.
+    epoch_params : None | dict
+        Filter band and window passed to ``dataset.get_epochs``.
+    n_jobs : int
+        Number of threads among which the runs of a subject are epoched.
+
+    Returns
+    -------
+    manifest : dict
+        The content of manifest.json.
+    """
+
+    if subjects is None:
+        subjects = dataset.subject_list
+    if epoch_params is None:
+        epoch_params = {}
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    shards, pending = [], []
+    shape = None
+    for i, subject in enumerate(subjects):
+        X, y, metadata = dataset.get_epochs(subject, run=run, n_jobs=n_jobs, **epoch_params)
+        shape = X.shape[1:]
+        pending.append({'X': X,
+                        'y': y,
+                        'subject': metadata['subject'].values.astype(np.int64),
+                        'session': np.array(metadata['session'].values, dtype=str),
+                        'run': np.array(metadata['run'].values, dtype=str),
+                        'sample': metadata['sample'].values.astype(np.int64)})
+        arrays = {field: np.concatenate([block[field] for block in pending])
+                  for field in FIELDS}
+
+        # write every full shard, and the last partial one after the last subject
+        n_epochs, start = len(arrays['y']), 0
+        while n_epochs - start >= shard_size or (i == len(subjects) - 1 and start < n_epochs):
+            shards.append(_write_shard(directory, len(shards),
+                                       {field: values[start:start + shard_size]
+                                        for field, values in arrays.items()}))
+            start += shard_size
+        pending = [{field: values[start:] for field, values in arrays.items()}]
+
+    manifest = {'version': SHARD_VERSION,
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'run': run,
+                'epoch_params': epoch_params,
+                'sfreq': SFREQ,
+                'ch_names': CHNAMES[:-1],
+                'dtype': np.dtype(dataset.dtype).name,
+                'epoch_shape': None if shape is None else list(shape),
+                'shard_size': shard_size,
+                'n_epochs': sum(shard['n_epochs'] for shard in shards),
+                'fields': FIELDS,
+                'shards': shards}
+    path = os.path.join(directory, 'manifest.json')
+    with open(path + '.tmp', 'w') as stream:
+        json.dump(manifest, stream, indent=2)
+    os.replace(path + '.tmp', path)
+    dataset.enforce_storage()
+
+    return manifest
+
+
+def read_manifest(directory):
+    """return the manifest of an export"""
+
+    with open(os.path.join(directory, 'manifest.json'), 'r') as stream:
+        manifest = json.load(stream)
+    if manifest['version'] != SHARD_VERSION:
+        raise(ValueError('shards of version {} cannot be read, expected {}'.format(
+            manifest['version'], SHARD_VERSION)))
+    return manifest
+
+
+def shard_files(manifest, rank=0, world_size=1):
+    """return the manifest entries of the shards assigned to a rank
+
+    Shards are dealt out in turn, so the ranks get the same number of
+    shards, give or take one, and every shard goes to exactly one rank.
+    A node only needs to copy these files and manifest.json.
+    """
+
+    if not 0 <= rank < world_size:
+        raise(ValueError('rank {} is not in [0, {})'.format(rank, world_size)))
+    return manifest['shards'][rank::world_size]
+
+
+def iter_shards(directory, rank=0, world_size=1, verify=False):
+    """read the shards of a rank sequentially
+
+    Parameters
+    ----------
+    directory : str
+        Folder holding manifest.json and at least the shards of the rank.
+    rank : int
+        Rank of the reader, in [0, world_size).
+    world_size : int
+        Number of readers among which the shards are split.
+    verify : bool
+        Whether to check the SHA-1 of every shard before reading it.
+
+    Yields
+    ------
+    X : ndarray, shape (n_epochs, n_channels, n_times)
+        The epochs of one shard.
+    y : ndarray, shape (n_epochs,)
+        Their labels, 1 for Target and 0 for NonTarget.
+    metadata : dict of ndarray
+        Their subject, session, run and onset sample.
+    """
+
+    manifest = read_manifest(directory)
+    for shard in shard_files(manifest, rank, world_size):
+        path = os.path.join(directory, shard['file'])
+        if verify and _sha1(path) != shard['sha1']:
+            raise(IOError('{} does not match its checksum in the manifest'.format(path)))
+        with np.load(path) as arrays:
+            yield arrays['X'], arrays['y'], {field: arrays[field] for field in FIELDS[2:]}
+
+
+def main(argv=None):
+    from .dataset import BrainInvaders2013
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--output', required=True, help='folder of the shards')
+    parser.add_argument('--subjects', type=int, nargs='+',
+                        help='subjects to export, default all')
+    parser.add_argument('--run', default='run_3',
+                        help="run exported within each session, 'all' for every run")
+    parser.add_argument('--shard-size', type=int, default=1024,
+                        help='number of epochs per shard')
+    parser.add_argument('--dtype', default='float64')
+    parser.add_argument('--fmin', type=float, default=1)
+    parser.add_argument('--fmax', type=float, default=24)
+    parser.add_argument('--tmin', type=float, default=0.0)
+    parser.add_argument('--tmax', type=float, default=1.0)
+    parser.add_argument('--n-jobs', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    dataset = BrainInvaders2013(dtype=args.dtype)
+    manifest = export_shards(dataset, args.output, subjects=args.subjects,
+                             run=None if args.run == 'all' else args.run,
+                             shard_size=args.shard_size, n_jobs=args.n_jobs,
+                             epoch_params={'fmin': args.fmin, 'fmax': args.fmax,
+                                           'tmin': args.tmin, 'tmax': args.tmax})
+    print('{} epochs written into {} shards in {}'.format(
+        manifest['n_epochs'], len(manifest['shards']), args.output), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
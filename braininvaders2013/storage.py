@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+import os
+import json
+import shutil
+
+MARKER = 'extracted.json'
+MARKER_VERSION = 1
+
+
+def write_marker(directory, signature, files):
+    """record a completed extraction in the folder of a subject
+
+    Parameters
+    ----------
+    directory : str
+        Folder of the subject.
+    signature : list
+        Signature of the archives the runs were extracted from, as kept by
+        the run index.
+    files : dict
+        Size in bytes of every extracted file, keyed by its path relative
+        to directory.
+    """
+
+    marker = {'version': MARKER_VERSION, 'signature': signature, 'files': files}
+    path = os.path.join(directory, MARKER)
+    with open(path + '.tmp', 'w') as stream:
+        json.dump(marker, stream)
+    os.replace(path + '.tmp', path)
+
+
+def read_marker(directory):
+    """return the extraction marker of a subject folder, or None"""
+
+    path = os.path.join(directory, MARKER)
+    if not os.path.isfile(path):
+        return None
+    with open(path, 'r') as stream:
+        marker = json.load(stream)
+    if marker.get('version') != MARKER_VERSION:
+        return None
+    return marker
+
+
+def verify_extraction(directory):
+    """return the marker of a subject folder if all its files are intact
+
+    Every file listed in the marker must exist with its recorded size;
+    otherwise, or without a marker, None is returned and the archives are
+    still needed.
+    """
+
+    marker = read_marker(directory)
+    if marker is None:
+        return None
+    for relpath, size in marker['files'].items():
+        path = os.path.join(directory, relpath)
+        if not os.path.isfile(path) or os.path.getsize(path) != size:
+            return None
+    return marker
+
+
+def _folder_sizes(directory):
+    """return the bytes of the runs and of the run caches in a subject folder"""
+
+    extracted, cached = 0, 0
+    for root, _, filenames in os.walk(directory):
+        for filename in filenames:
+            size = os.path.getsize(os.path.join(root, filename))
+            if filename.endswith('.mat') or filename == 'meta.yml':
+                extracted += size
+            elif filename != MARKER:
+                cached += size
+    return extracted, cached
+
+
+class DataManager(object):
+    """disk usage of the subjects of a dataset, and their eviction
+
+    The data of a subject are its zip archives and its folder, which holds
+    the extracted runs and meta.yml along with the binary caches of the
+    runs. Once the extraction of a subject has been verified, its archives
+    can be deleted: the dataset then relies on the extracted runs and only
+    downloads the archives again if these runs go missing. Subjects can
+    also be evicted altogether, least recently selected first, to keep the
+    data under a budget; an evicted subject is downloaded and extracted
+    again the next time it is selected.
+
+    The epoch store, which has its own budget, is not accounted for.
+
+    Parameters
+    ----------
+    dataset : BrainInvaders2013
+        The dataset whose data are managed.
+    """
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+
+    def usage(self, subjects=None):
+        """return the disk usage of some subjects
+
+        Returns
+        -------
+        usage : pandas.DataFrame
+            One row per subject with the bytes of its archives, of its
+            extracted runs and of its run caches, their total, whether its
+            extraction is verified, and the time at which it was last
+            selected (NaN if never).
+        """
+
+        import pandas as pd
+
+        if subjects is None:
+            subjects = self.dataset.subject_list
+        last_used = self.dataset._run_index().last_used()
+
+        rows = []
+        for subject in subjects:
+            archives = sum(os.path.getsize(path_zip) for path_zip in self.dataset._archive_paths(subject)
+                           if os.path.isfile(path_zip))
+            directory = self.dataset._subject_directory(subject)
+            extracted, cached = _folder_sizes(directory)
+            rows.append([subject, archives, extracted, cached, archives + extracted + cached,
+                         verify_extraction(directory) is not None, last_used.get(subject)])
+
+        return pd.DataFrame(rows, columns=['subject', 'archives', 'extracted', 'cache', 'total',
+                                           'verified', 'last_used'])
+
+    def total(self):
+        """return the bytes used by all the subjects"""
+        return int(self.usage()['total'].sum())
+
+    def delete_archives(self, subjects=None):
+        """delete the archives of the subjects whose extraction is verified
+
+        Returns
+        -------
+        freed : int
+            Number of bytes deleted.
+        """
+
+        if subjects is None:
+            subjects = self.dataset.subject_list
+
+        freed = 0
+        for subject in subjects:
+            if verify_extraction(self.dataset._subject_directory(subject)) is None:
+                continue
+            for path_zip in self.dataset._archive_paths(subject):
+                if os.path.isfile(path_zip):
+                    freed += os.path.getsize(path_zip)
+                    os.remove(path_zip)
+        return freed
+
+    def evict(self, subject):
+        """delete the archives, runs and caches of a subject
+
+        Returns
+        -------
+        freed : int
+            Number of bytes deleted.
+        """
+
+        freed = 0
+        for path_zip in self.dataset._archive_paths(subject):
+            if os.path.isfile(path_zip):
+                freed += os.path.getsize(path_zip)
+                os.remove(path_zip)
+            if os.path.isfile(path_zip + '.part'):
+                os.remove(path_zip + '.part')
+        directory = self.dataset._subject_directory(subject)
+        if os.path.isdir(directory):
+            freed += sum(os.path.getsize(os.path.join(root, filename))
+                         for root, _, filenames in os.walk(directory) for filename in filenames)
+            shutil.rmtree(directory)
+        self.dataset._run_index().drop(subject)
+        return freed
+
+    def enforce_budget(self, max_bytes, keep=()):
+        """evict the least recently selected subjects until under max_bytes
+
+        Parameters
+        ----------
+        max_bytes : int
+            Budget of the data of all the subjects, in bytes.
+        keep : list of int
+            Subjects that must not be evicted, e.g. those in use.
+
+        Returns
+        -------
+        evicted : list of int
+            The evicted subjects, in eviction order.
+        """
+
+        usage = self.usage()
+        usage = usage[usage['total'] > 0]
+        total = usage['total'].sum()
+        # subjects never selected go first, then the least recently selected
+        usage = usage.assign(last_used=usage['last_used'].fillna(-1.)).sort_values('last_used')
+
+        evicted = []
+        for subject, size in zip(usage['subject'], usage['total']):
+            if total <= max_bytes:
+                break
+            if subject in keep:
+                continue
+            self.evict(subject)
+            total -= size
+            evicted.append(int(subject))
+        return evicted
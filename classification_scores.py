@@ -1,12 +1,10 @@
 
 from sklearn.pipeline import make_pipeline
-from sklearn.model_selection import StratifiedKFold, cross_val_score
 from pyriemann.classification import MDM
 from pyriemann.estimation import ERPCovariances
 from braininvaders2013.dataset import BrainInvaders2013
-from sklearn.externals import joblib
-import numpy as np
-import mne
+from braininvaders2013.evaluation import evaluate, summarize
+from braininvaders2013.results import ResultStore
 """
 =============================
 Classification of the trials
@@ -24,55 +22,32 @@ Riemannian Geometry.
 import warnings
 warnings.filterwarnings("ignore")
 
-# define the dataset instance
-dataset = BrainInvaders2013(NonAdaptive=True, Adaptive=False, Training=True, Online=False)
+# one fresh classification pipeline per cross-validation fold
+def make_classifier():
+	return make_pipeline(ERPCovariances(estimator='lwf', classes=[1]), MDM())
 
-scores = {}
+if __name__ == '__main__':
 
-# get the data from subject of interest
-for subject in dataset.subject_list:
-	
-	scores[subject] = {}
+	# define the dataset instance
+	dataset = BrainInvaders2013(NonAdaptive=True, Adaptive=False, Training=True, Online=False)
 
-	data = dataset._get_single_subject_data(subject)
+	# every fold is appended to the store as soon as it is scored, and the
+	# folds already in the store are skipped, so an interrupted run resumes
+	store = ResultStore('./classification_scores.sqlite')
 
-	for session in data.keys():			
+	# 5-fold cross validation on run_3 of every subject and session, in parallel
+	table = evaluate(dataset, make_classifier, run='run_3', n_splits=5, scoring='roc_auc', n_jobs=-1,
+	                 store=store, pipeline='ERPCov+MDM')
+	table = summarize(table)
 
-		raw = data[session]['run_3']
-
-		# filter data and resample
-		fmin = 1
-		fmax = 24
-		raw.filter(fmin, fmax, verbose=False)
-
-		# detect the events and cut the signal into epochs
-		events = mne.find_events(raw=raw, shortest_event=1, verbose=False)
-		event_id = {'NonTarget': 33286, 'Target': 33285}
-		epochs = mne.Epochs(raw, events, event_id, tmin=0.0, tmax=1.0, baseline=None, verbose=False, preload=True)
-		epochs.pick_types(eeg=True)
-
-		# get trials and labels
-		X = epochs.get_data()
-		y = events[:, -1]
-		y[y == 33286] = 0
-		y[y == 33285] = 1
-
-		# cross validation
-		skf = StratifiedKFold(n_splits=5)
-		clf = make_pipeline(ERPCovariances(estimator='lwf', classes=[1]), MDM())
-		scr = cross_val_score(clf, X, y, cv=skf, scoring='roc_auc')
-
-		# print results of classification
-		scores[subject][session] = scr.mean()
-
-		print('subject', subject, session)
-		print(scr.mean())
-
-filename = './classification_scores.pkl'		
-joblib.dump(scores, filename)
-
-with open('classification_scores.txt', 'w') as the_file:
-    for subject in scores.keys():
-    	for session in scores[subject].keys():
-        	the_file.write('subject ' + str(subject).zfill(2) + ', ' + session + ' :' + ' {:.2f}'.format(scores[subject][session]) + '\n')
+	# print results of classification
+	scores = {}
+	for _, row in table.iterrows():
+		scores.setdefault(row['subject'], {})[row['session']] = row['score']
+		print('subject', row['subject'], row['session'])
+		print(row['score'])
 
+	with open('classification_scores.txt', 'w') as the_file:
+		for subject in scores.keys():
+			for session in scores[subject].keys():
+				the_file.write('subject ' + str(subject).zfill(2) + ', ' + session + ' :' + ' {:.2f}'.format(scores[subject][session]) + '\n')
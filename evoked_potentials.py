@@ -1,56 +1,25 @@
 
-import mne
-
-from pyriemann.classification import MDM
-from pyriemann.estimation import XdawnCovariances, ERPCovariances
-from tqdm import tqdm
-import matplotlib.pyplot as plt
-import numpy as np
-from sklearn.externals import joblib
-
 from braininvaders2013.dataset import BrainInvaders2013
+from braininvaders2013.evaluation import summarize
+from braininvaders2013.report import compute_evoked, render_evoked
+from braininvaders2013.results import ResultStore
 
-filename = 'classification_scores.pkl'
-scores = joblib.load(filename)
-dataset = BrainInvaders2013()
-
-# loop on list of subjects
-for subject in dataset.subject_list:
-
-	# get the raw object
-	sessions = dataset._get_single_subject_data(subject)
-
-	for session in sessions.keys():
-
-		raw = sessions[session]['run_3']
-
-		print('treating subject', str(subject).zfill(2))
-
-		chname2idx = {}
-		for i, chn in enumerate(raw.ch_names):
-			chname2idx[chn] = i
-
-		# filter data and resample
-		fmin = 1
-		fmax = 24
-		raw.filter(fmin, fmax, verbose=False)
+if __name__ == '__main__':
 
-		# detect the events and cut the signal into epochs
-		events = mne.find_events(raw=raw, shortest_event=1, verbose=False)
-		event_id = {'NonTarget': 33286, 'Target': 33285}
-		epochs = mne.Epochs(raw, events, event_id, tmin=0.0, tmax=0.8, baseline=None, verbose=False, preload=True)
-		epochs.pick_types(eeg=True)
+	# scores of classification_scores.py, averaged over the folds
+	store = ResultStore('./classification_scores.sqlite')
+	table = summarize(store.query(pipelines=['ERPCov+MDM'], runs=['run_3']))
+	scores = {}
+	for _, row in table.iterrows():
+		scores.setdefault(row['subject'], {})[row['session']] = row['score']
 
-		fig, ax = plt.subplots(facecolor='white', figsize=(10.9,  7.6))
-		evkTarget = epochs['Target'].average().data[chname2idx['Cz'],:]
-		evkNonTarget = epochs['NonTarget'].average().data[chname2idx['Cz'],:]
-		t = np.arange(len(evkTarget)) / epochs.info['sfreq']
-		ax.plot(t, evkTarget, c='#2166ac', lw=3.0, label='Target')
-		ax.plot(t, evkNonTarget, c='#b2182b', lw=3.0, label='NonTarget')
-		ax.set_xlim(0, 0.8)
-		ax.set_title('Average evoked potentials at electrode Cz for subject ' + str(subject) + ' (AUC : ' + '{:.2f}'.format(scores[subject][session]) + ')')
-		ax.legend()
+	dataset = BrainInvaders2013()
 
-		filename = './evoked_potentials/evoked_potentials_subject_' + str(subject).zfill(2) + '_' + session +'.pdf'
-		fig.savefig(filename, format='pdf')
+	# average the Target and NonTarget epochs at Cz for every subject and session,
+	# over 0-0.8 s of the 0-1 s epochs already computed by classification_scores.py
+	evoked = compute_evoked(dataset, run='run_3', channel='Cz', window=(0.0, 0.8), n_jobs=-1,
+	                        epoch_params={'fmin': 1, 'fmax': 24, 'tmin': 0.0, 'tmax': 1.0})
 
+	# draw one figure per session in parallel, plus a single multi-page PDF
+	render_evoked(evoked, folder='./evoked_potentials', scores=scores, channel='Cz', n_jobs=-1,
+	              pdf='./evoked_potentials.pdf')
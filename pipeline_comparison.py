@@ -0,0 +1,41 @@
+from sklearn.pipeline import make_pipeline
+from pyriemann.classification import MDM
+from pyriemann.estimation import ERPCovariances, XdawnCovariances
+from braininvaders2013.dataset import BrainInvaders2013
+from braininvaders2013.evaluation import compare, compare_table
+from braininvaders2013.results import ResultStore
+"""
+=============================
+Comparison of pipelines
+=============================
+
+This example compares several classification pipelines on the same
+cross-validation folds of every subject and session, loading and epoching
+each run only once for all of them.
+
+"""
+# License: BSD (3-clause)
+
+import warnings
+warnings.filterwarnings("ignore")
+
+# one fresh classification pipeline per cross-validation fold
+def make_erpcov_mdm():
+	return make_pipeline(ERPCovariances(estimator='lwf', classes=[1]), MDM())
+
+def make_xdawn_mdm():
+	return make_pipeline(XdawnCovariances(nfilter=4, classes=[1], estimator='lwf'), MDM())
+
+if __name__ == '__main__':
+
+	# define the dataset instance
+	dataset = BrainInvaders2013(NonAdaptive=True, Adaptive=False, Training=True, Online=False)
+
+	# the scores are shared with classification_scores.py, which uses the same folds
+	store = ResultStore('./classification_scores.sqlite')
+
+	pipelines = {'ERPCov+MDM': make_erpcov_mdm, 'XdawnCov+MDM': make_xdawn_mdm}
+	scores = compare(dataset, pipelines, run='run_3', n_splits=5, scoring='roc_auc', n_jobs=-1, store=store)
+
+	table = compare_table(scores)
+	print(table.to_string(float_format='{:.2f}'.format))
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+"""tests of the run cache"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from multiprocessing import Pool
+
+import numpy as np
+from scipy.io import savemat
+
+from braininvaders2013 import cache
+
+
+def _load_sum(file_path):
+    data, _ = cache.load_run(file_path)
+    return float(data.sum())
+
+
+class TestRunCache(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp(prefix='braininvaders2013-test-')
+        self.file_path = os.path.join(self.folder, 'Session1', 'subject10_1.mat')
+        os.makedirs(os.path.dirname(self.file_path))
+        self.data = np.random.RandomState(10).randn(20000, 17)
+        savemat(self.file_path, {'data': self.data})
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_concurrent_writers(self):
+        # every process finds the cache cold and writes it at once
+        with Pool(8) as pool:
+            for _ in range(5):
+                cache.clear(self.file_path)
+                sums = pool.map(_load_sum, [self.file_path] * 8)
+                self.assertEqual(len(set(sums)), 1)
+
+        data, sidecar = cache.load_run(self.file_path)
+        np.testing.assert_array_equal(data, self.data.T)
+        self.assertEqual(sidecar['shape'], list(self.data.T.shape))
+        self.assertEqual([name for name in os.listdir(os.path.dirname(self.file_path))
+                          if '.tmp' in name], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
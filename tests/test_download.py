@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+"""offline tests of the bulk downloader, against a local HTTP server"""
+
+import io
+import os
+import shutil
+import hashlib
+import zipfile
+import tempfile
+import threading
+import unittest
+from functools import partial
+from http.server import HTTPServer, SimpleHTTPRequestHandler
+from unittest import mock
+
+import numpy as np
+from scipy.io import savemat
+
+from braininvaders2013 import download as dl
+from braininvaders2013.dataset import BrainInvaders2013
+
+
+class _RangeHandler(SimpleHTTPRequestHandler):
+    """serve the files of a folder, honouring the ranges 'bytes=<start>-'"""
+
+    log = []
+
+    def do_GET(self):
+        path = self.translate_path(self.path)
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return
+        with open(path, 'rb') as stream:
+            content = stream.read()
+
+        start = 0
+        header = self.headers.get('Range')
+        if header is not None:
+            start = int(header.split('=')[1].split('-')[0])
+        if start >= len(content) and header is not None:
+            self.log.append((self.path, header, 416))
+            self.send_response(416)
+            self.send_header('Content-Range', 'bytes */{}'.format(len(content)))
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        status = 200 if header is None else 206
+        self.log.append((self.path, header, status))
+        self.send_response(status)
+        if header is not None:
+            self.send_header('Content-Range', 'bytes {}-{}/{}'.format(
+                start, len(content) - 1, len(content)))
+        self.send_header('Content-Length', str(len(content) - start))
+        self.end_headers()
+        self.wfile.write(content[start:])
+
+    def log_message(self, *args):
+        pass
+
+
+def _make_archive(path_zip, subject):
+    """write a small archive laid out as those of the Zenodo record"""
+
+    name = 'subject' + str(subject).zfill(2)
+    rng = np.random.RandomState(subject)
+    data = np.zeros((1024, 17))
+    data[:, :16] = rng.randn(1024, 16)
+    data[100:103, 16] = 33285
+    with zipfile.ZipFile(path_zip, 'w') as zip_ref:
+        zip_ref.writestr(name + '/meta.yml',
+                         'runs:\n- {filename: ' + name + '_1.gdf, '
+                         'experimental_condition: nonadaptive, type: training}\n')
+        stream = io.BytesIO()
+        savemat(stream, {'data': data})
+        zip_ref.writestr(name + '/Session1/' + name + '_1.mat', stream.getvalue())
+
+
+class TestDownload(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp(prefix='braininvaders2013-test-')
+        self.mirror = os.path.join(self.folder, 'mirror')
+        self.data = os.path.join(self.folder, 'data')
+        os.makedirs(self.mirror)
+        os.makedirs(self.data)
+        self.environ = mock.patch.dict(os.environ, {
+            'MNE_DATASETS_BRAININVADERS2013_PATH': self.data,
+            '_MNE_FAKE_HOME_DIR': self.folder})
+        self.environ.start()
+
+        _RangeHandler.log = []
+        handler = partial(_RangeHandler, directory=self.mirror)
+        self.server = HTTPServer(('127.0.0.1', 0), handler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+        self.base_url = 'http://127.0.0.1:{}/'.format(self.server.server_port)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        self.environ.stop()
+        shutil.rmtree(self.folder)
+
+    def _manifest(self, zipname):
+        with open(os.path.join(self.mirror, zipname), 'rb') as stream:
+            content = stream.read()
+        return {zipname: {'size': len(content),
+                          'checksum': 'md5:' + hashlib.md5(content).hexdigest()}}
+
+    def test_prefetch_then_data_path(self):
+        _make_archive(os.path.join(self.mirror, 'subject09.zip'), 9)
+        dataset = BrainInvaders2013()
+
+        paths = dataset.prefetch([9], base_url=self.base_url, progress=False,
+                                 manifest=self._manifest('subject09.zip'))
+        self.assertEqual(paths, dataset._archive_paths(9))
+        self.assertTrue(os.path.isfile(paths[0]))
+
+        # the prefetched archives are used, nothing is downloaded again
+        with mock.patch.object(dl, 'data_path', side_effect=AssertionError('downloaded again')):
+            file_paths = dataset.data_path(9)
+        self.assertEqual(len(file_paths), 1)
+        self.assertTrue(os.path.isfile(file_paths[0]))
+        self.assertEqual(len(_RangeHandler.log), 1)
+
+    def test_resume_partial_file(self):
+        _make_archive(os.path.join(self.mirror, 'subject09.zip'), 9)
+        url = self.base_url + 'subject09.zip'
+        destination = dl._destination(url, 'BRAININVADERS2013', self.data)
+        os.makedirs(os.path.dirname(destination))
+        with open(os.path.join(self.mirror, 'subject09.zip'), 'rb') as stream:
+            content = stream.read()
+        with open(destination + '.part', 'wb') as stream:
+            stream.write(content[:len(content) // 2])
+
+        paths = dl.fetch_many([url], 'BRAININVADERS2013', progress=False,
+                              manifest=self._manifest('subject09.zip'))
+        self.assertEqual(paths, [destination])
+        self.assertEqual(_RangeHandler.log[-1][2], 206)
+        self.assertFalse(os.path.isfile(destination + '.part'))
+        with open(destination, 'rb') as stream:
+            self.assertEqual(stream.read(), content)
+
+    def test_complete_partial_file_without_manifest(self):
+        _make_archive(os.path.join(self.mirror, 'subject09.zip'), 9)
+        url = self.base_url + 'subject09.zip'
+        destination = dl._destination(url, 'BRAININVADERS2013', self.data)
+        os.makedirs(os.path.dirname(destination))
+        shutil.copy(os.path.join(self.mirror, 'subject09.zip'), destination + '.part')
+
+        dl.fetch_many([url], 'BRAININVADERS2013', progress=False)
+        self.assertEqual(_RangeHandler.log[-1][2], 416)
+        with open(os.path.join(self.mirror, 'subject09.zip'), 'rb') as stream:
+            content = stream.read()
+        with open(destination, 'rb') as stream:
+            self.assertEqual(stream.read(), content)
+
+    def test_checksum_mismatch(self):
+        _make_archive(os.path.join(self.mirror, 'subject09.zip'), 9)
+        manifest = self._manifest('subject09.zip')
+        manifest['subject09.zip']['checksum'] = 'md5:' + '0' * 32
+
+        with self.assertRaises(IOError):
+            dl.fetch_many([self.base_url + 'subject09.zip'], 'BRAININVADERS2013',
+                          progress=False, manifest=manifest)
+
+
+if __name__ == '__main__':
+    unittest.main()